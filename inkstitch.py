@@ -5,6 +5,7 @@
 import cProfile
 import pstats
 import logging
+import multiprocessing
 import os
 import sys
 from argparse import ArgumentParser
@@ -45,61 +46,67 @@ formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
 ch.setFormatter(formatter)
 logger.addHandler(ch)
 
-parser = ArgumentParser()
-parser.add_argument("--extension")
-my_args, remaining_args = parser.parse_known_args()
+# The stitch plan can be generated in worker processes (see
+# lib/elements/parallel.py).  Those re-import this file, and they must not run
+# the extension again.
+if __name__ == "__main__":  # noqa: C901
+    multiprocessing.freeze_support()
 
-if os.path.exists(os.path.join(os.path.dirname(os.path.realpath(__file__)), "DEBUG")):
-    debug.enable()
+    parser = ArgumentParser()
+    parser.add_argument("--extension")
+    my_args, remaining_args = parser.parse_known_args()
 
-profiler = None
-if os.path.exists(os.path.join(os.path.dirname(os.path.realpath(__file__)), "PROFILE")):
-    profiler = cProfile.Profile()
-    profiler.enable()
+    if os.path.exists(os.path.join(os.path.dirname(os.path.realpath(__file__)), "DEBUG")):
+        debug.enable()
 
-extension_name = my_args.extension
+    profiler = None
+    if os.path.exists(os.path.join(os.path.dirname(os.path.realpath(__file__)), "PROFILE")):
+        profiler = cProfile.Profile()
+        profiler.enable()
 
-# example: foo_bar_baz -> FooBarBaz
-extension_class_name = extension_name.title().replace("_", "")
+    extension_name = my_args.extension
 
-extension_class = getattr(extensions, extension_class_name)
-extension = extension_class()
+    # example: foo_bar_baz -> FooBarBaz
+    extension_class_name = extension_name.title().replace("_", "")
 
-if (hasattr(sys, 'gettrace') and sys.gettrace()) or profiler is not None:
-    extension.run(args=remaining_args)
-    if profiler:
-        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "profile_stats")
-        profiler.disable()
-        profiler.dump_stats(path + ".prof")
+    extension_class = getattr(extensions, extension_class_name)
+    extension = extension_class()
 
-        with open(path, 'w') as stats_file:
-            stats = pstats.Stats(profiler, stream=stats_file)
-            stats.sort_stats(pstats.SortKey.CUMULATIVE)
-            stats.print_stats()
-
-        print(f"profiling stats written to {path} and {path}.prof", file=sys.stderr)
-else:
-    save_stderr()
-    exception = None
-    try:
+    if (hasattr(sys, 'gettrace') and sys.gettrace()) or profiler is not None:
         extension.run(args=remaining_args)
-    except (SystemExit, KeyboardInterrupt):
-        raise
-    except XMLSyntaxError:
-        msg = _("Ink/Stitch cannot read your SVG file. "
-                "This is often the case when you use a file which has been created with Adobe Illustrator.")
-        msg += "\n\n"
-        msg += _("Try to import the file into Inkscape through 'File > Import...' (Ctrl+I)")
-        errormsg(msg)
-    except InkstitchException as exc:
-        errormsg(str(exc))
-    except Exception:
-        errormsg(format_uncaught_exception())
-        sys.exit(1)
-    finally:
-        restore_stderr()
-
-        if shapely_errors.tell():
-            errormsg(shapely_errors.getvalue())
-
-    sys.exit(0)
+        if profiler:
+            path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "profile_stats")
+            profiler.disable()
+            profiler.dump_stats(path + ".prof")
+
+            with open(path, 'w') as stats_file:
+                stats = pstats.Stats(profiler, stream=stats_file)
+                stats.sort_stats(pstats.SortKey.CUMULATIVE)
+                stats.print_stats()
+
+            print(f"profiling stats written to {path} and {path}.prof", file=sys.stderr)
+    else:
+        save_stderr()
+        exception = None
+        try:
+            extension.run(args=remaining_args)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except XMLSyntaxError:
+            msg = _("Ink/Stitch cannot read your SVG file. "
+                    "This is often the case when you use a file which has been created with Adobe Illustrator.")
+            msg += "\n\n"
+            msg += _("Try to import the file into Inkscape through 'File > Import...' (Ctrl+I)")
+            errormsg(msg)
+        except InkstitchException as exc:
+            errormsg(str(exc))
+        except Exception:
+            errormsg(format_uncaught_exception())
+            sys.exit(1)
+        finally:
+            restore_stderr()
+
+            if shapely_errors.tell():
+                errormsg(shapely_errors.getvalue())
+
+        sys.exit(0)
@@ -7,8 +7,10 @@ import os
 import sys
 from copy import deepcopy
 from random import random
+from weakref import WeakKeyDictionary
 
 import inkex
+from lxml import etree
 from shapely import geometry as shgeo
 
 from .i18n import N_, _
@@ -75,6 +77,10 @@ class CommandParseError(Exception):
 
 
 class BaseCommand(object):
+    # A dict of id -> node provided by the CommandIndex.  If it's missing, we
+    # have to search the document.
+    nodes_by_id = None
+
     @property
     @cache
     def description(self):
@@ -105,6 +111,12 @@ class BaseCommand(object):
 
         id = url[1:]
 
+        if self.nodes_by_id is not None:
+            try:
+                return self.nodes_by_id[id]
+            except KeyError:
+                raise CommandParseError("could not find node by url %s" % id)
+
         try:
             return self.svg.xpath(".//*[@id='%s']" % id)[0]
         except (IndexError, AttributeError):
@@ -112,9 +124,10 @@ class BaseCommand(object):
 
 
 class Command(BaseCommand):
-    def __init__(self, connector):
+    def __init__(self, connector, nodes_by_id=None):
         self.connector = connector
         self.svg = self.connector.getroottree().getroot()
+        self.nodes_by_id = nodes_by_id
 
         self.parse_command()
 
@@ -151,9 +164,10 @@ class Command(BaseCommand):
 
 
 class StandaloneCommand(BaseCommand):
-    def __init__(self, use):
+    def __init__(self, use, nodes_by_id=None):
         self.node = use
         self.svg = self.node.getroottree().getroot()
+        self.nodes_by_id = nodes_by_id
 
         self.parse_command()
 
@@ -179,23 +193,176 @@ def get_command_description(command):
     return COMMANDS[command]
 
 
-def find_commands(node):
-    """Find the symbols this node is connected to and return them as Commands"""
+# The attributes that tie commands together: the symbols that command uses
+# point to, and both ends of every connector.
+_command_attributes = etree.XPath(
+    "//svg:use[starts-with(@xlink:href, '#inkstitch_')]/@xlink:href | //@inkscape:connection-start | //@inkscape:connection-end",
+    namespaces=inkex.NSS
+)
+
+
+class CommandIndex(object):
+    """All commands in a document, found in a single pass over the document.
 
-    # find all paths that have this object as a connection
-    xpath = ".//*[@inkscape:connection-start='#%(id)s' or @inkscape:connection-end='#%(id)s']" % dict(id=node.get('id'))
-    connectors = node.getroottree().getroot().xpath(xpath, namespaces=inkex.NSS)
+    Looking up the commands of an element used to mean searching the whole
+    document for connectors pointing to it.  Doing that for every element
+    takes time proportional to the square of the document size.  Instead, we
+    walk the document once, parse every connector and command symbol, and
+    remember them by the ids of the nodes they're attached to.
 
-    # try to turn them into commands
-    commands = []
-    for connector in connectors:
+    Use get_command_index() rather than creating a CommandIndex directly.
+    """
+
+    def __init__(self, svg):
+        self.svg = svg
+        self.nodes_by_id = {}
+        self.commands_by_id = {}
+        self.standalone_commands = []
+        self.fingerprint = self._get_fingerprint()
+        self.num_ids = self._get_num_ids()
+
+        connectors = []
+        symbol_uses = []
+        for node in svg.iter(etree.Element):
+            node_id = node.get('id')
+            if node_id is not None:
+                # xpath lookups used to return the first node with an id
+                self.nodes_by_id.setdefault(node_id, node)
+
+            if CONNECTION_START in node.attrib or CONNECTION_END in node.attrib:
+                connectors.append(node)
+
+            if node.tag == SVG_USE_TAG and node.get(XLINK_HREF, '').startswith('#inkstitch_'):
+                symbol_uses.append(node)
+
+        # the ends of every connector as we found them
+        self.connectors = [(connector, connector.get(CONNECTION_START), connector.get(CONNECTION_END))
+                           for connector in connectors]
+
+        for connector in connectors:
+            self._add_command(connector)
+
+        for use in symbol_uses:
+            try:
+                self.standalone_commands.append(StandaloneCommand(use, self.nodes_by_id))
+            except CommandParseError:
+                pass
+
+    def _add_command(self, connector):
         try:
-            commands.append(Command(connector))
+            command = Command(connector, self.nodes_by_id)
         except CommandParseError:
             # Parsing the connector failed, meaning it's not actually an Ink/Stitch command.
-            pass
+            return
+
+        # A connector is found for the nodes on both of its ends, just like
+        # the XPath search we used before.
+        urls = {connector.get(CONNECTION_START), connector.get(CONNECTION_END)}
+        for url in urls:
+            if url and url.startswith('#'):
+                self.commands_by_id.setdefault(url[1:], []).append(command)
+
+    def find_commands(self, node):
+        return list(self.commands_by_id.get(node.get('id'), []))
+
+    def is_current(self, node=None):
+        """Check whether the document was changed in a way that affects us.
+
+        We can't get notified of changes to the document.  Document-wide
+        lookups (node=None) are rare enough that we can afford to check all
+        command symbols and connectors in the document, which catches any
+        command that was added, removed or re-targeted.
+
+        Doing that for every element would make finding their commands as slow
+        as searching the document for each of them was, so per-node lookups
+        check what we cheaply can:
+
+          * inkex keeps track of the ids in the document as nodes are added
+            and removed, so a new connector (or any other new node) shows up
+            as a change in the number of ids
+          * the node must be known to us
+          * the connectors we know of must still be in the document and have
+            the same ends, so that re-targeting one is noticed
+
+        A connector added behind inkex's back (with plain lxml calls) is only
+        noticed by document-wide lookups, and at the start of the next run,
+        when the index is thrown away (see nodes_to_elements()).
+        """
+
+        if node is None:
+            # This also notices standalone commands that were removed.
+            return self._get_fingerprint() == self.fingerprint
+
+        if self._get_num_ids() != self.num_ids:
+            return False
+
+        node_id = node.get('id')
+        if node_id is not None and node_id not in self.nodes_by_id:
+            return False
+
+        for command in self.commands_by_id.get(node_id, []):
+            if not self._in_document(command.connector):
+                return False
+
+        for connector, start, end in self.connectors:
+            if connector.get(CONNECTION_START) != start or connector.get(CONNECTION_END) != end:
+                return False
+
+        return True
+
+    def _get_num_ids(self):
+        ids = getattr(self.svg, 'ids', None)
+        if ids is None:
+            return None
+
+        return len(ids)
+
+    def _get_fingerprint(self):
+        return [str(value) for value in _command_attributes(self.svg)]
 
-    return commands
+    def _in_document(self, node):
+        # Removed nodes still report the document's root from
+        # getroottree(), so we have to walk up to see if we get there.
+        for ancestor in node.iterancestors():
+            if ancestor is self.svg:
+                return True
+
+        return False
+
+
+_command_indexes = WeakKeyDictionary()
+
+
+def get_command_index(svg, node=None):
+    """Get the CommandIndex for this document, (re-)building it if necessary.
+
+    Arguments:
+        svg -- the root node of the document
+        node -- (optional) the node that is about to be looked up
+    """
+
+    index = _command_indexes.get(svg)
+    if index is None or not index.is_current(node):
+        index = _command_indexes[svg] = CommandIndex(svg)
+
+    return index
+
+
+def invalidate_command_index(svg):
+    """Forget the CommandIndex of this document.
+
+    Call this after adding, removing or re-targeting commands, and before
+    each run over the document's elements.
+    """
+
+    _command_indexes.pop(svg, None)
+
+
+def find_commands(node):
+    """Find the symbols this node is connected to and return them as Commands"""
+
+    svg = node.getroottree().getroot()
+    return get_command_index(svg, node).find_commands(node)
 
 
 def layer_commands(layer, command):
@@ -243,14 +410,7 @@ def global_command(svg, command):
 def _standalone_commands(svg):
     """Find all unconnected command symbols in the SVG."""
 
-    xpath = ".//svg:use[starts-with(@xlink:href, '#inkstitch_')]"
-    symbols = svg.xpath(xpath, namespaces=inkex.NSS)
-
-    for symbol in symbols:
-        try:
-            yield StandaloneCommand(symbol)
-        except CommandParseError:
-            pass
+    return list(get_command_index(svg).standalone_commands)
 
 
 def is_command(node):
@@ -413,6 +573,8 @@ def add_commands(element, commands, pos=None):
         symbol = add_symbol(svg, group, command, position)
         add_connector(svg, symbol, command, element)
 
+    invalidate_command_index(svg)
+
 
 def add_layer_commands(layer, commands):
     svg = layer.root
@@ -441,3 +603,5 @@ def add_layer_commands(layer, commands):
             "y": "-10",
             "transform": correction_transform
         }))
+
+    invalidate_command_index(svg)
@@ -19,7 +19,7 @@ from ..patterns import apply_patterns, get_patterns_cache_key_data
 from ..stitch_plan.lock_stitch import (LOCK_DEFAULTS, AbsoluteLock, CustomLock,
                                        LockStitch, SVGLock)
 from ..svg import (PIXELS_PER_MM, apply_transforms, convert_length,
-                   get_node_transform)
+                   get_node_cache_key_data, get_node_transform)
 from ..svg.tags import INKSCAPE_LABEL, INKSTITCH_ATTRIBS
 from ..utils import Point, cache
 from ..utils.cache import get_stitch_plan_cache, CacheKeyGenerator
@@ -518,6 +518,10 @@ class EmbroideryElement(object):
 
         return params
 
+    @cache
+    def _get_node_cache_key_data(self):
+        return get_node_cache_key_data(self.node)
+
     @cache
     def _get_patterns_cache_key_data(self):
         return get_patterns_cache_key_data(self.node)
@@ -532,9 +536,10 @@ class EmbroideryElement(object):
     def get_cache_key(self, previous_stitch):
         cache_key_generator = CacheKeyGenerator()
         cache_key_generator.update(self.__class__.__name__)
-        cache_key_generator.update(self.get_params_and_values())
-        cache_key_generator.update(self.parse_path())
-        cache_key_generator.update(list(self._get_specified_style().items()))
+        # The raw SVG attributes (path, transforms, style, params) of the node
+        # and its ancestors.  These are a lot cheaper to hash than the parsed
+        # path and the computed style.
+        cache_key_generator.update(self._get_node_cache_key_data())
         cache_key_generator.update(previous_stitch)
         cache_key_generator.update([(c.command, c.target_point) for c in self.commands])
         cache_key_generator.update(self._get_patterns_cache_key_data())
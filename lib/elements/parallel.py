@@ -0,0 +1,132 @@
+# Authors: see git history
+#
+# Copyright (c) 2023 Authors
+# Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import inkex
+from lxml import etree
+
+from ..debug import debug
+from ..utils.cache import get_stitch_plan_cache
+from ..utils.settings import global_settings
+from .clone import Clone
+from .utils import node_to_elements
+
+# The document each worker process embroiders from.  It's parsed once per
+# worker by _init_worker() rather than sent along with every element.
+_worker_document = None
+
+
+def get_stitch_plan_processes():
+    """How many processes to use to generate the stitch plan.
+
+    The setting "stitch_plan_processes" is 1 by default, which means that
+    everything runs in this process like it always has.  0 means "use all
+    available CPU cores".
+
+    Worker processes are forked on Linux, and forking a process that runs
+    other threads (like the Flask server behind the print preview and the
+    params dialog) is unsafe.  In that case we stay in this process.
+    """
+
+    if threading.active_count() > 1:
+        return 1
+
+    try:
+        processes = int(global_settings['stitch_plan_processes'])
+    except (KeyError, TypeError, ValueError):
+        processes = 1
+
+    if processes <= 0:
+        processes = os.cpu_count() or 1
+
+    return processes
+
+
+def embroider_elements_in_parallel(elements, processes):
+    """Warm the stitch plan cache by embroidering elements in worker processes.
+
+    Only elements whose stitches don't depend on where the previous element
+    ended are sent to the workers.  This includes fills with a fill_start
+    command.  Everything else still has to be embroidered one after the
+    other, so we leave those for the caller.
+
+    The workers don't return stitches to us.  Instead, they save their
+    results in the stitch plan cache just like element.embroider() always
+    does.  When the caller then embroiders all elements in order, the
+    independent ones are simply loaded from the cache.  This keeps the cache
+    as the single source of truth and guarantees that the result is exactly
+    the same as if we'd run everything in this process.
+
+    If a worker fails for any reason (including validation errors), we only
+    log the error.  The caller will embroider that element again and report
+    the error in the usual way.
+    """
+
+    if processes <= 1 or not elements:
+        return
+
+    tasks = _get_uncached_independent_elements(elements)
+    if len(tasks) < 2:
+        # not worth the overhead of starting up worker processes
+        return
+
+    document = etree.tostring(elements[0].node.getroottree())
+    processes = min(processes, len(tasks))
+
+    debug.log(f"embroidering {len(tasks)} elements in {processes} processes")
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(document,)) as executor:
+        for node_path, element_class, error in executor.map(_embroider_element, tasks):
+            if error is not None:
+                debug.log(f"worker failed to embroider {element_class} at {node_path}: {error}")
+
+
+def _get_uncached_independent_elements(elements):
+    stitch_plan_cache = get_stitch_plan_cache()
+
+    tasks = []
+    for element in elements:
+        # Clones pass the previous stitch group on to their source element, so
+        # they aren't independent, even though they claim to be.
+        if element.uses_previous_stitch() or isinstance(element, Clone):
+            continue
+
+        if element.get_cache_key(None) in stitch_plan_cache:
+            continue
+
+        # We can't pickle lxml nodes, so we tell the worker where to find the
+        # node in its own copy of the document instead.
+        node_path = element.node.getroottree().getpath(element.node)
+        tasks.append((node_path, element.__class__.__name__))
+
+    return tasks
+
+
+def _init_worker(document):
+    global _worker_document
+    _worker_document = inkex.load_svg(BytesIO(document)).getroot()
+
+
+def _embroider_element(task):
+    node_path, element_class = task
+
+    try:
+        node = _worker_document.xpath(node_path)[0]
+        for element in node_to_elements(node):
+            if element.__class__.__name__ == element_class:
+                # this stores the result in the stitch plan cache
+                element.embroider(None)
+
+                # Worker processes don't run atexit handlers, so make sure the
+                # result actually makes it to disk.
+                get_stitch_plan_cache().flush()
+                return node_path, element_class, None
+    except Exception as exc:
+        return node_path, element_class, f"{exc.__class__.__name__}: {exc}"
+
+    return node_path, element_class, "element not found"
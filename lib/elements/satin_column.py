@@ -20,7 +20,7 @@ from ..metadata import InkStitchMetadata
 from ..stitch_plan import StitchGroup
 from ..stitches import running_stitch
 from ..svg import line_strings_to_csp, point_lists_to_csp
-from ..utils import Point, cache, cut, cut_multiple, prng
+from ..utils import ArcLengthIndex, Point, cache, cut, cut_multiple, prng
 from ..utils.param import ParamOption
 from ..utils.threading import check_stop_flag
 from .element import PIXELS_PER_MM, EmbroideryElement, param
@@ -667,6 +667,17 @@ class SatinColumn(EmbroideryElement):
 
         return sections
 
+    @property
+    @cache
+    def flattened_section_indexes(self):
+        """An ArcLengthIndex for both rails of each of the flattened sections.
+
+        The satin and all of its underlays plot their points on the same
+        sections, so we only measure them once.
+        """
+
+        return [(ArcLengthIndex(section0), ArcLengthIndex(section1)) for section0, section1 in self.flattened_sections]
+
     def validation_warnings(self):
         if len(self.csp) == 2 and len(self.rails[0]) != len(self.rails[1]):
             yield UnequalPointsWarning(self.flattened_rails[0].interpolate(0.5, normalized=True))
@@ -956,10 +967,15 @@ class SatinColumn(EmbroideryElement):
             # separation between them.
             #  _________
             #  \_______/
-            normal = previous_stitch.unit().rotate_left()
-            d0 = pos0 - previous_pos0
-            d1 = pos1 - previous_pos1
-            return max(abs(d0 * normal), abs(d1 * normal))
+            #
+            # This is called several times for every stitch, so we do the math
+            # on plain floats rather than creating Points.
+            length = previous_stitch.length()
+            normal_x = -previous_stitch.y / length
+            normal_y = previous_stitch.x / length
+            d0 = (pos0.x - previous_pos0.x) * normal_x + (pos0.y - previous_pos0.y) * normal_y
+            d1 = (pos1.x - previous_pos1.x) * normal_x + (pos1.y - previous_pos1.y) * normal_y
+            return max(abs(d0), abs(d1))
 
     @debug.time
     def plot_points_on_rails(self, spacing, offset_px=(0, 0), offset_proportional=(0, 0), use_random=False
@@ -980,8 +996,7 @@ class SatinColumn(EmbroideryElement):
                 old_pos1 = section1[0]
                 pairs.append(processor.process_points(old_pos0, old_pos1))
 
-            path0 = shgeo.LineString(section0)
-            path1 = shgeo.LineString(section1)
+            path0, path1 = self.flattened_section_indexes[i]
 
             # Base the number of stitches in each section on the _longer_ of
             # the two sections. Otherwise, things could get too sparse when one
@@ -1007,8 +1022,8 @@ class SatinColumn(EmbroideryElement):
             iterations = 0
             while cursor + to_travel <= 1:
                 iterations += 1
-                pos0 = Point.from_shapely_point(path0.interpolate(cursor + to_travel, normalized=True))
-                pos1 = Point.from_shapely_point(path1.interpolate(cursor + to_travel, normalized=True))
+                pos0 = path0.interpolate(cursor + to_travel, normalized=True)
+                pos1 = path1.interpolate(cursor + to_travel, normalized=True)
 
                 # If the rails are parallel, then our stitch spacing will be
                 # perfect.  If the rails are coming together or spreading apart,
@@ -1492,15 +1507,15 @@ class SatinProcessor:
         self.random_zigzag_spacing = satin.random_zigzag_spacing
 
         if use_random:
-            self.seed = prng.join_args(satin.random_seed, "satin-points")
+            # one block of random numbers per call to process_points() or
+            # get_stitch_spacing_multiple(), generated in bulk
+            self.rolls = prng.iter_uniform_float_blocks(satin.random_seed, "satin-points")
             self.offset_proportional_min = np.array(offset_proportional) - satin.random_width_decrease
             self.offset_range = (satin.random_width_increase + satin.random_width_decrease)
-            self.cycle = 0
 
     def process_points(self, pos0, pos1):
         if self.use_random:
-            roll = prng.uniform_floats(self.seed, self.cycle)
-            self.cycle += 1
+            roll = next(self.rolls)
             offset_prop = self.offset_proportional_min + roll[0:2] * self.offset_range
         else:
             offset_prop = self.offset_proportional
@@ -1510,8 +1525,7 @@ class SatinProcessor:
 
     def get_stitch_spacing_multiple(self):
         if self.use_random:
-            roll = prng.uniform_floats(self.seed, self.cycle)
-            self.cycle += 1
+            roll = next(self.rolls)
             return max(1.0 + ((roll[0] - 0.5) * 2) * self.random_zigzag_spacing, 0.01)
         else:
             return 1.0
@@ -3,7 +3,7 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
-from ..commands import is_command
+from ..commands import invalidate_command_index, is_command
 from ..marker import has_marker
 from ..svg.tags import (EMBROIDERABLE_TAGS, SVG_IMAGE_TAG, SVG_PATH_TAG,
                         SVG_POLYGON_TAG, SVG_POLYLINE_TAG, SVG_TEXT_TAG)
@@ -60,6 +60,12 @@ def node_to_elements(node, clone_to_element=False):  # noqa: C901
 
 
 def nodes_to_elements(nodes):
+    nodes = list(nodes)
+    if nodes:
+        # Each set of elements is a new run, and the document may have changed
+        # since the last one, so the elements should see its commands afresh.
+        invalidate_command_index(nodes[0].getroottree().getroot())
+
     elements = []
     for node in nodes:
         elements.extend(node_to_elements(node))
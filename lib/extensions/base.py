@@ -11,6 +11,8 @@ from lxml.etree import Comment
 from ..commands import is_command, layer_commands
 from ..elements import EmbroideryElement, nodes_to_elements
 from ..elements.clone import is_clone
+from ..elements.parallel import (embroider_elements_in_parallel,
+                                 get_stitch_plan_processes)
 from ..i18n import _
 from ..marker import has_marker
 from ..metadata import InkStitchMetadata
@@ -124,6 +126,11 @@ class InkstitchExtension(inkex.EffectExtension):
         return False
 
     def elements_to_stitch_groups(self, elements):
+        # Elements that don't depend on the previous stitch can be embroidered
+        # in worker processes first.  Their results end up in the stitch plan
+        # cache, so the loop below will just pick them up in the right order.
+        embroider_elements_in_parallel(elements, get_stitch_plan_processes())
+
         patches = []
         for element in elements:
             if patches:
@@ -25,6 +25,7 @@ class DensityMap(InkstitchExtension):
         self.arg_parser.add_argument("-r", "--density-radius-red", type=float, default=0.5, dest="radius_red")
         self.arg_parser.add_argument("-m", "--num-neighbors-yellow", type=int, default=3, dest="num_neighbors_yellow")
         self.arg_parser.add_argument("-s", "--density-radius-yellow", type=float, default=0.5, dest="radius_yellow")
+        self.arg_parser.add_argument("--marker-output", type=str, default="markers", dest="marker_output")
 
     def effect(self):
         # delete old stitch plan
@@ -44,7 +45,7 @@ class DensityMap(InkstitchExtension):
         color_groups = create_color_groups(layer)
         density_options = [{'max_neighbors': self.options.num_neighbors_red, 'radius': self.options.radius_red},
                            {'max_neighbors': self.options.num_neighbors_yellow, 'radius': self.options.radius_yellow}]
-        color_block_to_density_markers(svg, color_groups, stitch_plan, density_options)
+        color_block_to_density_markers(svg, color_groups, stitch_plan, density_options, self.options.marker_output)
 
         # update layer visibility 0 = unchanged, 1 = hidden, 2 = lower opacity
         groups = self.document.getroot().findall(SVG_GROUP_TAG)
@@ -91,45 +92,83 @@ def create_color_groups(layer):
     return color_groups
 
 
-def color_block_to_density_markers(svg, groups, stitch_plan, density_options):
-    num_neighbors = []
+def color_block_to_density_markers(svg, groups, stitch_plan, density_options, output="markers"):
+    """Add a marker for each stitch, colored by how many stitches are close by.
+
+    output can be "markers" for one circle per stitch, or "paths" for one
+    path per color that holds all markers of that color.  Huge designs can
+    have hundreds of thousands of stitches, which makes for a very big and
+    slow SVG with one element each.
+    """
+
+    stitches = get_stitch_coordinates(stitch_plan)
+    if not len(stitches):
+        return
+
+    densities = {}
+    too_dense = []
     for option in density_options:
         radius = option['radius'] * PIXELS_PER_MM
-        num_neighbors.append(get_stitch_density(stitch_plan, radius))
-
-    red_group, yellow_group, green_group = groups
-    for red_neighbors, yellow_neighbors, coord in zip(num_neighbors[0][0], num_neighbors[1][0], num_neighbors[0][1]):
-        color = "green"  # green
-        group = green_group
-        if density_options[0]['max_neighbors'] <= red_neighbors:
-            color = "red"
-            group = red_group
-        elif density_options[1]['max_neighbors'] <= yellow_neighbors:
-            color = "yellow"
-            group = yellow_group
+        if radius not in densities:
+            densities[radius] = get_stitch_density(stitches, radius)
+        too_dense.append(densities[radius] >= option['max_neighbors'])
+
+    red = too_dense[0]
+    yellow = too_dense[1] & ~red
+    green = ~(red | yellow)
+
+    for group, color, mask in zip(groups, ("red", "yellow", "green"), (red, yellow, green)):
+        if output == "paths":
+            add_density_path(svg, group, color, stitches[mask])
+        else:
+            add_density_markers(svg, group, color, stitches[mask])
+
+
+def add_density_markers(svg, group, color, coords):
+    style = "fill: %s; stroke: #7e7e7e; stroke-width: 0.02%%;" % color
+    transform = get_correction_transform(svg)
+
+    for x, y in coords.tolist():
         density_marker = inkex.Circle(attrib={
             'id': svg.get_unique_id("density_marker"),
-            'style': "fill: %s; stroke: #7e7e7e; stroke-width: 0.02%%;" % color,
-            'cx': "%s" % coord[0],
-            'cy': "%s" % coord[1],
+            'style': style,
+            'cx': "%s" % x,
+            'cy': "%s" % y,
             'r': str(0.5),
-            'transform': get_correction_transform(svg)
+            'transform': transform
         })
         group.append(density_marker)
 
 
-def get_stitch_density(stitch_plan, radius):
-    stitches = []
-    for color_block in stitch_plan:
-        for stitch in color_block:
-            stitches.append((stitch.x, stitch.y))
+def add_density_path(svg, group, color, coords):
+    if not len(coords):
+        return
+
+    # each marker is a circle with a radius of 0.5 made of two arcs
+    path = " ".join("M %s,%s a 0.5,0.5 0 1,0 -1,0 a 0.5,0.5 0 1,0 1,0 z" % (x + 0.5, y) for x, y in coords.tolist())
+    density_path = inkex.PathElement(attrib={
+        'id': svg.get_unique_id("density_markers"),
+        'style': "fill: %s; stroke: #7e7e7e; stroke-width: 0.02%%;" % color,
+        'd': path,
+        'transform': get_correction_transform(svg)
+    })
+    group.append(density_path)
+
+
+def get_stitch_coordinates(stitch_plan):
+    stitches = [(stitch.x, stitch.y) for color_block in stitch_plan for stitch in color_block]
+    return np.array(stitches, dtype=float).reshape(-1, 2)
+
+
+def get_stitch_density(stitches, radius):
+    """Count the stitches within radius of each stitch (including itself).
 
-    # get density per stitch
-    tree = KDTree(np.array(stitches))
-    neighbors = tree.query_ball_tree(tree, radius)
-    density = [len(i) for i in neighbors], stitches
+    Only the counts are returned, so unlike query_ball_tree() this doesn't
+    build a list of neighbors for every stitch.
+    """
 
-    return density
+    tree = KDTree(stitches)
+    return tree.query_ball_point(stitches, radius, return_length=True)
 
 
 @cache
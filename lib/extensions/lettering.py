@@ -17,15 +17,15 @@ import wx.lib.agw.floatspin as fs
 from ..elements import nodes_to_elements
 from ..gui import PresetsPanel, SimulatorPreview, info_dialog
 from ..i18n import _
-from ..lettering import Font, FontError
+from ..lettering import FontCatalog, FontError
 from ..lettering.categories import FONT_CATEGORIES, FontCategory
 from ..svg import get_correction_transform
 from ..svg.tags import (INKSCAPE_LABEL, INKSTITCH_LETTERING, SVG_GROUP_TAG,
                         SVG_PATH_TAG)
-from ..utils import DotDict, cache, get_bundled_dir, get_resource_dir
+from ..utils import (DotDict, cache, get_bundled_dir, get_custom_font_dir,
+                     get_resource_dir)
 from ..utils.threading import ExitThread
 from .commands import CommandsExtension
-from .lettering_custom_font_dir import get_custom_font_dir
 
 
 class LetteringFrame(wx.Frame):
@@ -157,8 +157,7 @@ class LetteringFrame(wx.Frame):
 
     @property
     @cache
-    def font_list(self):
-        fonts = []
+    def font_catalog(self):
         font_paths = {
             get_bundled_dir("fonts"),
             os.path.expanduser("~/.inkstitch/fonts"),
@@ -166,18 +165,7 @@ class LetteringFrame(wx.Frame):
             get_custom_font_dir()
         }
 
-        for font_path in font_paths:
-            try:
-                font_dirs = os.listdir(font_path)
-            except OSError:
-                continue
-
-            for font_dir in font_dirs:
-                font = Font(os.path.join(font_path, font_dir))
-                if font.marked_custom_font_name == "" or font.marked_custom_font_id == "":
-                    continue
-                fonts.append(font)
-        return fonts
+        return FontCatalog(font_paths)
 
     def update_font_list(self):
         self.fonts = {}
@@ -185,24 +173,18 @@ class LetteringFrame(wx.Frame):
 
         # font size filter value
         filter_size = self.font_size_filter.GetValue()
-        filter_glyph = self.font_glyph_filter.GetValue()
         filter_category = self.font_category_filter.GetSelection() - 1
 
         # glyph filter string without spaces
-        glyphs = [*self.text_editor.GetValue().replace(" ", "").replace("\n", "")]
-
-        for font in self.font_list:
-            if filter_glyph and glyphs and not set(glyphs).issubset(font.available_glyphs):
-                continue
-
-            if filter_category != -1:
-                category = FONT_CATEGORIES[filter_category].id
-                if category not in font.keywords:
-                    continue
+        glyphs = None
+        if self.font_glyph_filter.GetValue():
+            glyphs = [*self.text_editor.GetValue().replace(" ", "").replace("\n", "")]
 
-            if filter_size != 0 and (filter_size < font.size * font.min_scale or filter_size > font.size * font.max_scale):
-                continue
+        category = None
+        if filter_category != -1:
+            category = FONT_CATEGORIES[filter_category].id
 
+        for font in self.font_catalog.filter(filter_size, glyphs, category):
             self.fonts[font.marked_custom_font_name] = font
             self.fonts_by_id[font.marked_custom_font_id] = font
 
@@ -39,17 +39,3 @@ class LetteringCustomFontDir(InkstitchExtension):
 
         with open(config_path, 'w', encoding="utf8") as font_data:
             json.dump(data, font_data, indent=4, ensure_ascii=False)
-
-
-def get_custom_font_dir():
-    custom_font_dir_path = os.path.join(appdirs.user_config_dir('inkstitch'), 'custom_dirs.json')
-    try:
-        with open(custom_font_dir_path, 'r') as custom_dirs:
-            custom_dir = json.load(custom_dirs)
-    except (IOError, ValueError):
-        return ""
-    try:
-        return custom_dir['custom_font_dir']
-    except KeyError:
-        pass
-    return ""
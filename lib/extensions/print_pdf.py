@@ -9,12 +9,13 @@ import os
 import socket
 import sys
 import time
-from copy import deepcopy
 from datetime import date
+from io import BytesIO
 from threading import Thread
 from contextlib import closing
 
 import appdirs
+import inkex
 from flask import Flask, Response, jsonify, request, send_from_directory
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from lxml import etree
@@ -25,7 +26,6 @@ from ..i18n import get_languages
 from ..i18n import translation as inkstitch_translation
 from ..stitch_plan import stitch_groups_to_stitch_plan
 from ..svg import render_stitch_plan
-from ..svg.tags import INKSCAPE_GROUPMODE
 from ..threads import ThreadCatalog
 from .base import InkstitchExtension
 
@@ -57,13 +57,78 @@ def save_defaults(defaults):
         json.dump(defaults, defaults_file)
 
 
+class PrintPreviewRenderer(object):
+    """Renders the stitch plan SVGs for the print preview.
+
+    The SVGs don't contain a copy of the whole document, just its root
+    element, the stitch plan layer and the defs that the stitch plan needs.
+    Each color block is rendered once, and the overview is made out of the
+    same rendered color blocks.  The results are kept, so the realistic
+    SVGs are only rendered the first time someone asks for them.
+    """
+
+    def __init__(self, document, stitch_plan):
+        self.document = document
+        self.stitch_plan = stitch_plan
+        self._svgs = {}
+
+    def get_svgs(self, realistic=False):
+        """Return the overview SVG and a list of SVGs, one for each color block."""
+
+        if realistic not in self._svgs:
+            self._svgs[realistic] = self._render(realistic)
+
+        return self._svgs[realistic]
+
+    def _render(self, realistic):
+        # An empty document with the same size and viewBox as ours
+        root = self.document.makeelement(self.document.tag, self.document.attrib, nsmap=self.document.nsmap)
+        svg = inkex.load_svg(BytesIO(etree.tostring(root))).getroot()
+        render_stitch_plan(svg, self.stitch_plan, realistic, visual_commands=False, relative=True)
+
+        # objects outside of the viewbox are invisible
+        # TODO: if we want them to be seen, we need to redefine document size to fit the design
+        #       this is just a quick fix and doesn't work on realistic view
+        svg.set('style', 'overflow:visible;')
+
+        strip_namespaces(svg)
+
+        # Now the stitch plan layer will contain a set of groups, each
+        # corresponding to a color block.  We'll create a set of SVG files
+        # corresponding to each individual color block and a final one
+        # for all color blocks together.
+        stitch_plan_layer = svg.find(".//*[@id='__inkstitch_stitch_plan__']")
+        color_block_groups = stitch_plan_layer.getchildren()
+
+        overview_svg = etree.tostring(svg).decode('utf-8')
+        color_block_svgs = []
+
+        for group in color_block_groups:
+            # clear the stitch plan layer
+            del stitch_plan_layer[:]
+
+            # add in just this group
+            stitch_plan_layer.append(group)
+
+            # save an SVG preview
+            color_block_svgs.append(etree.tostring(svg).decode('utf-8'))
+
+        return overview_svg, color_block_svgs
+
+
+def strip_namespaces(svg):
+    # namespace prefixes seem to trip up HTML, so get rid of them
+    for element in svg.iter():
+        if type(element.tag) == str and element.tag[0] == '{':
+            element.tag = element.tag[element.tag.index('}', 1) + 1:]
+
+
 class PrintPreviewServer(Thread):
     def __init__(self, *args, **kwargs):
         self.html = kwargs.pop('html')
         self.metadata = kwargs.pop('metadata')
         self.stitch_plan = kwargs.pop('stitch_plan')
-        self.realistic_overview_svg = kwargs.pop('realistic_overview_svg')
-        self.realistic_color_block_svgs = kwargs.pop('realistic_color_block_svgs')
+        self.renderer = kwargs.pop('renderer')
         Thread.__init__(self, *args, **kwargs)
         self.daemon = True
         self.flask_server = None
@@ -149,11 +214,11 @@ class PrintPreviewServer(Thread):
 
         @self.app.route('/realistic/block<int:index>', methods=['GET'])
         def get_realistic_block(index):
-            return Response(self.realistic_color_block_svgs[index], mimetype='image/svg+xml')
+            return Response(self.renderer.get_svgs(realistic=True)[1][index], mimetype='image/svg+xml')
 
         @self.app.route('/realistic/overview', methods=['GET'])
         def get_realistic_overview():
-            return Response(self.realistic_overview_svg, mimetype='image/svg+xml')
+            return Response(self.renderer.get_svgs(realistic=True)[0], mimetype='image/svg+xml')
 
     def stop(self):
         self.flask_server.shutdown()
@@ -213,56 +278,6 @@ class Print(InkstitchExtension):
 
         return env
 
-    def strip_namespaces(self, svg):
-        # namespace prefixes seem to trip up HTML, so get rid of them
-        for element in svg.iter():
-            if type(element.tag) == str and element.tag[0] == '{':
-                element.tag = element.tag[element.tag.index('}', 1) + 1:]
-
-    def render_svgs(self, stitch_plan, realistic=False):
-        svg = deepcopy(self.document).getroot()
-        render_stitch_plan(svg, stitch_plan, realistic, visual_commands=False)
-
-        self.strip_namespaces(svg)
-
-        # Now the stitch plan layer will contain a set of groups, each
-        # corresponding to a color block.  We'll create a set of SVG files
-        # corresponding to each individual color block and a final one
-        # for all color blocks together.
-
-        layers = svg.findall("./g[@%s='layer']" % INKSCAPE_GROUPMODE)
-        stitch_plan_layer = svg.find(".//*[@id='__inkstitch_stitch_plan__']")
-
-        # Make sure there is no leftover translation from stitch plan preview
-        stitch_plan_layer.pop('transform')
-
-        # objects outside of the viewbox are invisible
-        # TODO: if we want them to be seen, we need to redefine document size to fit the design
-        #       this is just a quick fix and doesn't work on realistic view
-        svg.set('style', 'overflow:visible;')
-
-        # First, delete all of the other layers.  We don't need them and they'll
-        # just bulk up the SVG.
-        for layer in layers:
-            if layer is not stitch_plan_layer:
-                svg.remove(layer)
-
-        overview_svg = etree.tostring(svg).decode('utf-8')
-        color_block_groups = stitch_plan_layer.getchildren()
-        color_block_svgs = []
-
-        for i, group in enumerate(color_block_groups):
-            # clear the stitch plan layer
-            del stitch_plan_layer[:]
-
-            # add in just this group
-            stitch_plan_layer.append(group)
-
-            # save an SVG preview
-            color_block_svgs.append(etree.tostring(svg).decode('utf-8'))
-
-        return overview_svg, color_block_svgs
-
     def render_html(self, stitch_plan, overview_svg, selected_palette):
         env = self.build_environment()
         template = env.get_template('index.html')
@@ -314,8 +329,9 @@ class Print(InkstitchExtension):
         stitch_plan = stitch_groups_to_stitch_plan(patches, collapse_len=collapse_len, min_stitch_len=min_stitch_len)
         palette = ThreadCatalog().match_and_apply_palette(stitch_plan, self.get_inkstitch_metadata()['thread-palette'])
 
-        overview_svg, color_block_svgs = self.render_svgs(stitch_plan, realistic=False)
-        realistic_overview_svg, realistic_color_block_svgs = self.render_svgs(stitch_plan, realistic=True)
+        # The realistic SVGs are only rendered if the print preview asks for them.
+        renderer = PrintPreviewRenderer(self.document.getroot(), stitch_plan)
+        overview_svg, color_block_svgs = renderer.get_svgs(realistic=False)
 
         for i, svg in enumerate(color_block_svgs):
             stitch_plan.color_blocks[i].svg_preview = svg
@@ -326,8 +342,7 @@ class Print(InkstitchExtension):
             html=html,
             metadata=self.get_inkstitch_metadata(),
             stitch_plan=stitch_plan,
-            realistic_overview_svg=realistic_overview_svg,
-            realistic_color_block_svgs=realistic_color_block_svgs
+            renderer=renderer
         )
         print_server.start()
         # Wait for print_server.host and print_server.port to be populated.
@@ -40,7 +40,7 @@ class StitchPlanPreview(InkstitchExtension):
         min_stitch_len = self.metadata['min_stitch_len_mm']
         patches = self.elements_to_stitch_groups(self.elements)
         stitch_plan = stitch_groups_to_stitch_plan(patches, collapse_len=collapse_len, min_stitch_len=min_stitch_len)
-        render_stitch_plan(svg, stitch_plan, realistic, visual_commands)
+        render_stitch_plan(svg, stitch_plan, realistic, visual_commands, relative=True)
 
         # apply options
         layer = svg.find(".//*[@id='__inkstitch_stitch_plan__']")
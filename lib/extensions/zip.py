@@ -3,10 +3,8 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
-import os
 import sys
-import tempfile
-from copy import deepcopy
+from io import BytesIO
 from zipfile import ZipFile
 
 from inkex import Boolean
@@ -14,8 +12,10 @@ from lxml import etree
 
 import pyembroidery
 
+from ..debug import debug
+from ..elements.parallel import get_stitch_plan_processes
 from ..i18n import _
-from ..output import write_embroidery_file
+from ..output import get_origin, patterns_to_bytes, stitch_plan_to_pattern
 from ..stitch_plan import stitch_groups_to_stitch_plan
 from ..svg import PIXELS_PER_MM
 from ..threads import ThreadCatalog
@@ -65,50 +65,53 @@ class Zip(InkstitchExtension):
             stitch_plan = self._make_offsets(stitch_plan)
 
         base_file_name = self._get_file_name()
-        path = tempfile.mkdtemp()
-
-        files = []
-
-        for format in self.formats:
-            if getattr(self.options, format):
-                output_file = os.path.join(path, "%s.%s" % (base_file_name, format))
-                if format == 'svg':
-                    document = deepcopy(self.document.getroot())
-                    with open(output_file, 'w', encoding='utf-8') as svg:
-                        svg.write(etree.tostring(document).decode('utf-8'))
-                elif format == 'threadlist':
-                    output_file = os.path.join(path, "%s_%s.txt" % (base_file_name, _("threadlist")))
-                    output = open(output_file, 'w', encoding='utf-8')
-                    output.write(self.get_threadlist(stitch_plan, base_file_name))
-                    output.close()
-                else:
-                    write_embroidery_file(output_file, stitch_plan, self.document.getroot())
-                files.append(output_file)
+        formats = [format for format in self.formats if getattr(self.options, format)]
+        embroidery_formats = [format for format in formats if format not in ('svg', 'threadlist')]
+
+        # Write the embroidery files first: the threadlist changes the thread
+        # colors in the stitch plan.
+        files = self._write_embroidery_files(stitch_plan, embroidery_formats)
+
+        for format in formats:
+            if format == 'svg':
+                files[format] = etree.tostring(self.document.getroot())
+            elif format == 'threadlist':
+                files[format] = self.get_threadlist(stitch_plan, base_file_name).encode('utf-8')
 
         if not files:
             self.errormsg(_("No embroidery file formats selected."))
 
-        temp_file = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+        # Build the zip in memory and hand it straight to inkscape, which will
+        # read the file contents from stdout and copy them to the destination
+        # file that the user chose.
+        zip_buffer = BytesIO()
+        with ZipFile(zip_buffer, "w") as zip_file:
+            for format in formats:
+                if format == 'threadlist':
+                    file_name = "%s_%s.txt" % (base_file_name, _("threadlist"))
+                else:
+                    file_name = "%s.%s" % (base_file_name, format)
+                zip_file.writestr(file_name, files[format])
+
+        sys.stdout.buffer.write(zip_buffer.getvalue())
 
-        # in windows, failure to close here will keep the file locked
-        temp_file.close()
+        # don't let inkex output the SVG!
+        sys.exit(0)
 
-        with ZipFile(temp_file.name, "w") as zip_file:
-            for file in files:
-                zip_file.write(file, os.path.basename(file))
+    def _write_embroidery_files(self, stitch_plan, formats):
+        """Write the stitch plan in each of the formats and return the files' contents by format."""
 
-        # inkscape will read the file contents from stdout and copy
-        # to the destination file that the user chose
-        with open(temp_file.name, 'rb') as output_file:
-            sys.stdout.buffer.write(output_file.read())
+        if not formats:
+            return {}
 
-        os.remove(temp_file.name)
-        for file in files:
-            os.remove(file)
-        os.rmdir(path)
+        svg = self.document.getroot()
+        pattern = stitch_plan_to_pattern(stitch_plan, svg)
+        origin = get_origin(svg, stitch_plan.bounding_box)
 
-        # don't let inkex output the SVG!
-        sys.exit(0)
+        with debug.time_this("writing %d embroidery formats" % len(formats)):
+            contents = patterns_to_bytes(pattern, origin, formats, get_stitch_plan_processes())
+
+        return dict(zip(formats, contents))
 
     def _get_file_name(self):
         if self.options.custom_file_name:
@@ -81,7 +81,7 @@ class PreferencesFrame(wx.Frame):
         # add space above and below to center sizer_4 vertically
         sizer_3.Add((0, 20), 1, wx.EXPAND, 0)
 
-        sizer_4 = wx.FlexGridSizer(3, 4, 15, 10)
+        sizer_4 = wx.FlexGridSizer(4, 4, 15, 10)
         sizer_3.Add(sizer_4, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 20)
 
         label_5 = wx.StaticText(self.global_page, wx.ID_ANY, _("Default minimum jump stitch length"), style=wx.ALIGN_LEFT)
@@ -135,6 +135,22 @@ class PreferencesFrame(wx.Frame):
         self.clear_cache_button = wx.Button(self.global_page, wx.ID_ANY, _("Clear Stitch Plan Cache"))
         sizer_4.Add(self.clear_cache_button, 0, wx.ALIGN_CENTER_VERTICAL, 0)
 
+        label_11 = wx.StaticText(self.global_page, wx.ID_ANY, _("Stitch plan processes"), style=wx.ALIGN_LEFT)
+        label_11.SetToolTip(_("Number of processes used to generate stitches for objects which don't depend on the previous object. "
+                              "Use 1 to disable parallel processing and 0 to use all CPU cores."))
+        sizer_4.Add(label_11, 1, wx.ALIGN_CENTER_VERTICAL, 0)
+
+        self.stitch_plan_processes = wx.SpinCtrl(
+            self.global_page, wx.ID_ANY,
+            value=str(global_settings['stitch_plan_processes']),
+            style=wx.ALIGN_RIGHT | wx.SP_ARROW_KEYS,
+            min=0, max=256
+        )
+        sizer_4.Add(self.stitch_plan_processes, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT, 0)
+
+        sizer_4.Add((0, 0), 0, 0, 0)
+        sizer_4.Add((0, 0), 0, 0, 0)
+
         sizer_3.Add((0, 0), 1, wx.EXPAND, 0)
 
         button_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -186,6 +202,7 @@ class PreferencesFrame(wx.Frame):
         global_settings['default_min_stitch_len_mm'] = self.default_minimum_stitch_length.GetValue()
         global_settings['default_collapse_len_mm'] = self.default_minimum_jump_stitch_length.GetValue()
         global_settings['cache_size'] = self.stitch_plan_cache_size.GetValue()
+        global_settings['stitch_plan_processes'] = self.stitch_plan_processes.GetValue()
 
         # cache size may have changed
         stitch_plan_cache = get_stitch_plan_cache()
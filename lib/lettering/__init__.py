@@ -3,4 +3,5 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
+from .catalog import CatalogFont, FontCatalog
 from .font import Font, FontError
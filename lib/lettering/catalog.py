@@ -0,0 +1,182 @@
+# Authors: see git history
+#
+# Copyright (c) 2023 Authors
+# Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
+
+import os
+
+from ..i18n import _
+from ..utils import get_custom_font_dir
+from ..utils.cache import get_lettering_cache
+from .font import Font, FontError, font_metadata, localized_font_metadata
+from .font_variant import FontVariant
+
+# Change this whenever the catalog entries change.
+CATALOG_VERSION = 1
+
+# The font.json entries we need to list and filter fonts.  The others (like
+# kerning pairs) can be big, so we leave them out.  Localized names and
+# descriptions ("name_de", ...) are kept as well.
+CATALOG_METADATA = ('name', 'description', 'keywords', 'size', 'min_scale', 'max_scale', 'glyphs', 'reversible')
+
+
+class CatalogFont(object):
+    """A font as listed in the FontCatalog.
+
+    This knows enough about a font to list and filter it.  The Font itself
+    is only loaded when it's needed: by load() or render_text().
+    """
+
+    def __init__(self, path, metadata, variants, preview_image, is_custom_font):
+        self.path = path
+        self.metadata = metadata
+        self.variants = variants
+        self.preview_image = preview_image
+        self._is_custom_font = is_custom_font
+        self._font = None
+
+        self.glyph_set = frozenset(self.available_glyphs)
+
+    name = localized_font_metadata('name', '')
+    description = localized_font_metadata('description', '')
+    keywords = font_metadata('keywords', '')
+    size = font_metadata('size', 0)
+    min_scale = font_metadata('min_scale', 1.0)
+    max_scale = font_metadata('max_scale', 1.0)
+    reversible = font_metadata('reversible', True)
+    available_glyphs = font_metadata('glyphs', [])
+
+    @property
+    def id(self):
+        return os.path.basename(self.path)
+
+    @property
+    def marked_custom_font_id(self):
+        if not self.is_custom_font():
+            return self.id
+        else:
+            return self.id + '*'
+
+    @property
+    def marked_custom_font_name(self):
+        if not self.is_custom_font():
+            return self.name
+        else:
+            return self.name + '*'
+
+    def is_custom_font(self):
+        return self._is_custom_font
+
+    def has_variants(self):
+        if not self.variants:
+            raise FontError(_("The font '%s' has no variants.") % self.name)
+        return self.variants
+
+    def load(self):
+        """Return the Font, loading it if necessary."""
+
+        if self._font is None:
+            self._font = Font(self.path)
+
+        return self._font
+
+    def render_text(self, *args, **kwargs):
+        return self.load().render_text(*args, **kwargs)
+
+
+class FontCatalog(object):
+    """An index of all fonts in a set of font directories.
+
+    Loading hundreds of fonts just to list them is slow, because some
+    font.json files are big.  The catalog remembers what it needs to know
+    about each font in the lettering cache, and only reads a font's files
+    again if the font's directory, font.json, preview or variant directories
+    changed since then.
+    """
+
+    def __init__(self, font_paths):
+        self.font_paths = font_paths
+        self.fonts = self._load_fonts()
+
+    def filter(self, size=0, glyphs=None, category=None):
+        """Return the fonts that match all of the given filters.
+
+        Arguments:
+          size     -- a text size in mm that the font can be scaled to, 0 for all sizes
+          glyphs   -- characters that the font has to have
+          category -- a FontCategory id
+        """
+
+        glyphs = set(glyphs or ())
+
+        fonts = []
+        for font in self.fonts:
+            if glyphs and not glyphs.issubset(font.glyph_set):
+                continue
+
+            if category is not None and category not in font.keywords:
+                continue
+
+            if size != 0 and (size < font.size * font.min_scale or size > font.size * font.max_scale):
+                continue
+
+            fonts.append(font)
+
+        return fonts
+
+    def _load_fonts(self):
+        lettering_cache = get_lettering_cache()
+        custom_font_dir = get_custom_font_dir()
+
+        fonts = []
+        for font_path in self.font_paths:
+            try:
+                font_dirs = os.listdir(font_path)
+            except OSError:
+                continue
+
+            cache_key = ("font catalog", CATALOG_VERSION, os.path.abspath(font_path))
+            entries = lettering_cache.get(cache_key, {})
+            new_entries = {}
+
+            for font_dir in font_dirs:
+                path = os.path.join(font_path, font_dir)
+                stamp = self._get_stamp(path)
+
+                entry = entries.get(font_dir)
+                if entry is None or entry['stamp'] != stamp:
+                    entry = self._index_font(path, stamp)
+                new_entries[font_dir] = entry
+
+                font = CatalogFont(path, entry['metadata'], entry['variants'], entry['preview_image'],
+                                   bool(custom_font_dir) and custom_font_dir in path)
+                if font.marked_custom_font_name == "" or font.marked_custom_font_id == "":
+                    continue
+                fonts.append(font)
+
+            if new_entries != entries:
+                lettering_cache[cache_key] = new_entries
+
+        return fonts
+
+    def _get_stamp(self, path):
+        # Adding or removing files changes the modification time of their
+        # directory, but editing font.json in place doesn't.
+        stamp = []
+        for name in ('', 'font.json', 'preview.png', *FontVariant.VARIANT_TYPES):
+            try:
+                stamp.append(os.stat(os.path.join(path, name)).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+
+        return tuple(stamp)
+
+    def _index_font(self, path, stamp):
+        font = Font(path)
+        metadata = {key: value for key, value in font.metadata.items()
+                    if key in CATALOG_METADATA or key.split('_', 1)[0] in ('name', 'description')}
+
+        return dict(stamp=stamp,
+                    metadata=metadata,
+                    variants=FontVariant.available_variants(path),
+                    preview_image=font.preview_image)
@@ -13,14 +13,13 @@ import inkex
 from ..commands import add_commands, ensure_symbol
 from ..elements import SatinColumn, Stroke, nodes_to_elements
 from ..exceptions import InkstitchException
-from ..extensions.lettering_custom_font_dir import get_custom_font_dir
 from ..i18n import _, get_languages
 from ..marker import MARKER, ensure_marker, has_marker
 from ..stitches.auto_satin import auto_satin
 from ..svg.tags import (CONNECTION_END, CONNECTION_START, EMBROIDERABLE_TAGS,
                         INKSCAPE_LABEL, INKSTITCH_ATTRIBS, SVG_GROUP_TAG,
                         SVG_PATH_TAG, SVG_USE_TAG, XLINK_HREF)
-from ..utils import Point
+from ..utils import Point, get_custom_font_dir
 from .font_variant import FontVariant
 
 
@@ -100,14 +99,14 @@ class Font(object):
         except IOError:
             pass
 
-    def _load_variants(self):
-        if not self.variants:
-            for variant in FontVariant.VARIANT_TYPES:
-                try:
-                    self.variants[variant] = FontVariant(self.path, variant, self.default_glyph)
-                except IOError:
-                    # we'll deal with missing variants when we apply lettering
-                    pass
+    def _load_variant(self, variant):
+        # Variants are only loaded when they're needed.
+        if variant in FontVariant.VARIANT_TYPES and variant not in self.variants:
+            try:
+                self.variants[variant] = FontVariant(self.path, variant, self.default_glyph)
+            except IOError:
+                # we'll deal with missing variants when we apply lettering
+                pass
 
     name = localized_font_metadata('name', '')
     description = localized_font_metadata('description', '')
@@ -158,13 +157,7 @@ class Font(object):
 
     def has_variants(self):
         # returns available variants
-        font_variants = []
-        for variant in FontVariant.VARIANT_TYPES:
-            if os.path.isfile(os.path.join(self.path, "%s.svg" % variant)):
-                font_variants.append(variant)
-            elif (os.path.isdir(os.path.join(self.path, "%s" % variant)) and
-                    [svg for svg in os.listdir(os.path.join(self.path, "%s" % variant)) if svg.endswith('.svg')]):
-                font_variants.append(variant)
+        font_variants = FontVariant.available_variants(self.path)
         if not font_variants:
             raise FontError(_("The font '%s' has no variants.") % self.name)
         return font_variants
@@ -192,19 +185,19 @@ class Font(object):
     def render_text(self, text, destination_group, variant=None, back_and_forth=True, trim_option=0, use_trim_symbols=False):
 
         """Render text into an SVG group element."""
-        self._load_variants()
 
         if variant is None:
             variant = self.default_variant
 
         if back_and_forth and self.reversible:
-            glyph_sets = [self.get_variant(variant), self.get_variant(FontVariant.reversed_variant(variant))]
+            variants = [variant, FontVariant.reversed_variant(variant)]
         else:
-            glyph_sets = [self.get_variant(variant)] * 2
+            variants = [variant] * 2
 
         position = Point(0, 0)
         for i, line in enumerate(text.splitlines()):
-            glyph_set = glyph_sets[i % 2]
+            # the reversed variant is only loaded if there's a second line
+            glyph_set = self.get_variant(variants[i % 2])
             line = line.strip()
 
             letter_group = self._render_line(line, position, glyph_set)
@@ -239,7 +232,12 @@ class Font(object):
         return destination_group
 
     def get_variant(self, variant):
-        return self.variants.get(variant, self.variants[self.default_variant])
+        self._load_variant(variant)
+        if variant not in self.variants:
+            self._load_variant(self.default_variant)
+            return self.variants[self.default_variant]
+
+        return self.variants[variant]
 
     def _render_line(self, line, position, glyph_set):
         """Render a line of text.
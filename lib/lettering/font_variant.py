@@ -3,15 +3,21 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
+import hashlib
 import os
 
 import inkex
 
 from ..svg.tags import (INKSCAPE_GROUPMODE, INKSCAPE_LABEL, SVG_GROUP_TAG,
                         SVG_PATH_TAG, SVG_USE_TAG)
-from ..update import update_inkstitch_document
+from ..update import INKSTITCH_SVG_VERSION, update_inkstitch_document
+from ..utils.cache import get_lettering_cache
 from .glyph import Glyph
 
+# Change this whenever the way glyphs are prepared changes, so that glyphs
+# that were cached by older versions are ignored.
+GLYPH_CACHE_VERSION = (1, INKSTITCH_SVG_VERSION)
+
 
 class FontVariant(object):
     """Represents a single variant of a font.
@@ -25,7 +31,13 @@ class FontVariant(object):
     Properties:
       path    -- the path to the directory containing this font
       variant -- the font variant, specified using one of the constants below
-      glyphs  -- a dict of Glyphs, with the glyphs' unicode characters as keys.
+      glyphs  -- a dict of the Glyphs loaded so far, with the glyphs' unicode
+                 characters as keys.
+
+    Glyphs are loaded the first time they're used.  Parsing and preparing
+    the font's SVG files is slow, so the prepared glyphs are stored in a disk
+    cache.  The cache key includes each file's modification time and a hash
+    of its contents, so editing a font file makes us load it again.
     """
 
     # We use unicode characters rather than English strings for font file names
@@ -49,6 +61,19 @@ class FontVariant(object):
         else:
             return None
 
+    @classmethod
+    def available_variants(cls, font_path):
+        """Return the variants that have font files in font_path."""
+
+        font_variants = []
+        for variant in cls.VARIANT_TYPES:
+            if os.path.isfile(os.path.join(font_path, "%s.svg" % variant)):
+                font_variants.append(variant)
+            elif (os.path.isdir(os.path.join(font_path, "%s" % variant)) and
+                    [svg for svg in os.listdir(os.path.join(font_path, "%s" % variant)) if svg.endswith('.svg')]):
+                font_variants.append(variant)
+        return font_variants
+
     def __init__(self, font_path, variant, default_glyph=None):
         # If the font variant file does not exist, this constructor will
         # raise an exception.  The caller should catch it and decide
@@ -58,25 +83,80 @@ class FontVariant(object):
         self.variant = variant
         self.default_glyph = default_glyph
         self.glyphs = {}
-        self._load_glyphs()
 
-    def _load_glyphs(self):
-        variant_file_paths = self._get_variant_file_paths()
-        for svg_path in variant_file_paths:
+        # Glyphs are only loaded when they're first used.  Until then, we
+        # just remember which file each one is in.
+        self._glyph_files = {}
+        self._file_cache_keys = {}
+        self._glyph_layers = {}
+        self._index_glyphs()
+
+    def _index_glyphs(self):
+        lettering_cache = get_lettering_cache()
+
+        for svg_path in self._get_variant_file_paths():
+            file_cache_key = self._get_file_cache_key(svg_path)
+            self._file_cache_keys[svg_path] = file_cache_key
+
+            glyph_names = lettering_cache.get((file_cache_key, "glyph names"))
+            if glyph_names is None:
+                glyph_names = list(self._get_glyph_layers(svg_path))
+                lettering_cache[(file_cache_key, "glyph names")] = glyph_names
+
+            for glyph_name in glyph_names:
+                self._glyph_files[glyph_name] = svg_path
+
+    def _get_file_cache_key(self, svg_path):
+        with open(svg_path, "rb") as svg_file:
+            content_hash = hashlib.sha256(svg_file.read()).hexdigest()
+
+        return (GLYPH_CACHE_VERSION, os.path.abspath(svg_path), os.stat(svg_path).st_mtime_ns, content_hash)
+
+    def _get_glyph_layers(self, svg_path):
+        """Parse a font file and return its glyph layers by glyph name."""
+
+        if svg_path not in self._glyph_layers:
             document = inkex.load_svg(svg_path)
             update_inkstitch_document(document)
             svg = document.getroot()
             svg = self._apply_transforms(svg)
 
-            glyph_layers = svg.xpath(".//svg:g[starts-with(@inkscape:label, 'GlyphLayer-')]", namespaces=inkex.NSS)
-            for layer in glyph_layers:
+            glyph_layers = {}
+            for layer in svg.xpath(".//svg:g[starts-with(@inkscape:label, 'GlyphLayer-')]", namespaces=inkex.NSS):
                 self._clean_group(layer)
                 layer.attrib[INKSCAPE_LABEL] = layer.attrib[INKSCAPE_LABEL].replace("GlyphLayer-", "", 1)
-                glyph_name = layer.attrib[INKSCAPE_LABEL]
-                try:
-                    self.glyphs[glyph_name] = Glyph(layer)
-                except AttributeError:
-                    pass
+                glyph_layers[layer.attrib[INKSCAPE_LABEL]] = layer
+            self._glyph_layers[svg_path] = glyph_layers
+
+        return self._glyph_layers[svg_path]
+
+    def _get_glyph(self, glyph_name):
+        if glyph_name not in self.glyphs and glyph_name in self._glyph_files:
+            glyph = self._load_glyph(glyph_name)
+            if glyph is None:
+                # not a usable glyph, forget about it
+                del self._glyph_files[glyph_name]
+            else:
+                self.glyphs[glyph_name] = glyph
+
+        return self.glyphs.get(glyph_name)
+
+    def _load_glyph(self, glyph_name):
+        lettering_cache = get_lettering_cache()
+
+        svg_path = self._glyph_files[glyph_name]
+        cache_key = (self._file_cache_keys[svg_path], glyph_name)
+        glyph = lettering_cache.get(cache_key)
+
+        if glyph is None:
+            try:
+                glyph = Glyph(self._get_glyph_layers(svg_path)[glyph_name])
+            except AttributeError:
+                # We store False so that we don't try again next time.
+                glyph = False
+            lettering_cache[cache_key] = glyph
+
+        return glyph or None
 
     def _get_variant_file_paths(self):
         file_paths = []
@@ -122,10 +202,11 @@ class FontVariant(object):
         return svg
 
     def __getitem__(self, character):
-        if character in self.glyphs:
-            return self.glyphs[character]
-        else:
-            return self.glyphs.get(self.default_glyph, None)
+        glyph = self._get_glyph(character)
+        if glyph is None:
+            glyph = self._get_glyph(self.default_glyph)
+
+        return glyph
 
     def __contains__(self, character):
-        return character in self.glyphs
+        return self._get_glyph(character) is not None
@@ -4,8 +4,10 @@
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
 from copy import copy
+from io import BytesIO
 
-from inkex import paths, transforms, units
+from inkex import load_svg, paths, transforms, units
+from lxml import etree
 
 from ..svg import get_correction_transform, get_guides
 from ..svg.tags import (CONNECTION_END, SVG_GROUP_TAG, SVG_PATH_TAG,
@@ -41,6 +43,19 @@ class Glyph(object):
         self._move_to_origin()
         self._process_commands()
 
+    def __getstate__(self):
+        # lxml nodes can't be pickled, so we store the node as XML.
+        state = dict(vars(self))
+        state['node'] = (etree.tostring(self.node, with_tail=False), self.node.tail)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        xml, tail = state['node']
+        state['node'] = load_svg(BytesIO(xml)).getroot()
+        state['node'].tail = tail
+        vars(self).update(state)
+
     def _process_group(self, group):
         new_group = copy(group)
         # new_group.attrib.pop('transform', None)
@@ -10,7 +10,8 @@ from shapely import geometry as shgeo
 
 import inkex
 
-from .svg.tags import EMBROIDERABLE_TAGS
+from .svg.svg import get_attributes_cache_key_data
+from .svg.tags import EMBROIDERABLE_TAGS, SVG_GROUP_TAG
 from .utils import cache, get_bundled_dir
 
 MARKER = ['pattern', 'guide-line']
@@ -79,13 +80,24 @@ def get_marker_elements(node, marker, get_fills=True, get_strokes=True, get_sati
 
 
 def get_marker_elements_cache_key_data(node, marker):
-    marker_elements = get_marker_elements(node, marker, True, True, True)
+    """Get data that changes whenever the marker elements next to this node change.
 
-    marker_elements['fill'] = [shape.wkt for shape in marker_elements['fill']]
-    marker_elements['stroke'] = [shape.wkt for shape in marker_elements['stroke']]
-    marker_elements['satin'] = [satin.csp for satin in marker_elements['satin']]
+    Instead of parsing the marker shapes, we use their raw attributes.  Their
+    parent transforms are the same as the node's, so they're already part of
+    the node's own cache key.
 
-    return marker_elements
+    Markers can be edited at any time in long-running processes, so we look
+    at them again on every call.
+    """
+
+    parent = node.getparent()
+    if parent is None or parent.tag != SVG_GROUP_TAG:
+        return b""
+
+    style = "marker-start:url(#inkstitch-%s-marker" % marker
+    markers = [sibling for sibling in parent
+               if sibling.tag in EMBROIDERABLE_TAGS and style in (sibling.get('style') or '')]
+    return b"\0".join(get_attributes_cache_key_data(marker_node) for marker_node in markers)
 
 
 def has_marker(node, marker=list()):
@@ -5,28 +5,32 @@
 
 import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import inkex
+import numpy as np
 import pyembroidery
 
 from .commands import global_command
+from .debug import debug
 from .i18n import _
-from .stitch_plan import Stitch
+from .stitch_plan.color_block import COLOR_CHANGE, JUMP, STOP, TRIM
 from .svg import PIXELS_PER_MM
 from .utils import Point
 
+# The pattern and origin each worker process writes files from.  They're
+# sent to each worker once by _init_worker() rather than for every file.
+_worker_pattern = None
 
-def get_command(stitch):
-    if stitch.jump:
-        return pyembroidery.JUMP
-    elif stitch.trim:
-        return pyembroidery.TRIM
-    elif stitch.color_change:
-        return pyembroidery.COLOR_CHANGE
-    elif stitch.stop:
-        return pyembroidery.STOP
-    else:
-        return pyembroidery.NEEDLE_AT
+
+def get_commands(commands):
+    """Convert a ColorBlock's command bits to pyembroidery commands."""
+
+    return np.select([commands & JUMP != 0, commands & TRIM != 0, commands & COLOR_CHANGE != 0, commands & STOP != 0],
+                     [pyembroidery.JUMP, pyembroidery.TRIM, pyembroidery.COLOR_CHANGE, pyembroidery.STOP],
+                     pyembroidery.NEEDLE_AT)
 
 
 def _string_to_floats(string):
@@ -46,37 +50,62 @@ def get_origin(svg, bounding_box):
         return default
 
 
-def jump_to_stop_point(pattern, svg):
-    stop_position = global_command(svg, "stop_position")
-    if stop_position:
-        pattern.add_stitch_absolute(pyembroidery.JUMP, stop_position.point.x, stop_position.point.y)
-
+def stitch_plan_to_pattern(stitch_plan, svg):
+    """Convert a StitchPlan into a pyembroidery EmbPattern.
 
-def write_embroidery_file(file_path, stitch_plan, svg, settings={}):
-    # convert from pixels to millimeters
-    # also multiply by 10 to get tenths of a millimeter as required by pyembroidery
-    scale = 10 / PIXELS_PER_MM
-
-    origin = get_origin(svg, stitch_plan.bounding_box)
-    # origin = origin * scale
+    The pattern's stitch list is built straight from each ColorBlock's
+    arrays rather than one Stitch at a time.  The pattern is in pixels and
+    doesn't depend on the file format, so it can be written to any number
+    of files with write_pattern().
+    """
 
     pattern = pyembroidery.EmbPattern()
 
     # For later use when writing .dst header title field.
     pattern.extras['name'] = os.path.splitext(svg.name)[0]
 
-    stitch = Stitch(0, 0)
+    stop_position = global_command(svg, "stop_position")
+    last_x = last_y = 0
 
     for color_block in stitch_plan:
         pattern.add_thread(color_block.color.pyembroidery_thread)
 
-        for stitch in color_block:
-            if stitch.stop:
-                jump_to_stop_point(pattern, svg)
-            command = get_command(stitch)
-            pattern.add_stitch_absolute(command, stitch.x, stitch.y)
+        if not len(color_block):
+            continue
+
+        xs, ys = color_block.coordinates.T.tolist()
+        commands = get_commands(color_block.commands).tolist()
+
+        if stop_position:
+            # jump to the stop position before each stop
+            for i in reversed(np.flatnonzero(color_block.commands & STOP).tolist()):
+                xs.insert(i, stop_position.point.x)
+                ys.insert(i, stop_position.point.y)
+                commands.insert(i, pyembroidery.JUMP)
+
+        pattern.stitches.extend([x, y, command] for x, y, command in zip(xs, ys, commands))
+        last_x, last_y = xs[-1], ys[-1]
+
+    pattern.add_stitch_absolute(pyembroidery.END, last_x, last_y)
+
+    return pattern
+
+
+def write_embroidery_file(file_path, stitch_plan, svg, settings={}):
+    pattern = stitch_plan_to_pattern(stitch_plan, svg)
+    origin = get_origin(svg, stitch_plan.bounding_box)
+    write_pattern(file_path, pattern, origin, settings)
+
 
-    pattern.add_stitch_absolute(pyembroidery.END, stitch.x, stitch.y)
+def write_pattern(file_path, pattern, origin, settings={}):
+    """Write a pattern made by stitch_plan_to_pattern() to an embroidery file."""
+
+    # Don't change the caller's settings (or our default).
+    settings = dict(settings)
+
+    # convert from pixels to millimeters
+    # also multiply by 10 to get tenths of a millimeter as required by pyembroidery
+    scale = 10 / PIXELS_PER_MM
 
     settings.update({
         # correct for the origin
@@ -113,3 +142,51 @@ def write_embroidery_file(file_path, stitch_plan, svg, settings={}):
         msg = _("Error writing to %(path)s: %(error)s") % dict(path=file_path, error=e.strerror)
         inkex.errormsg(msg)
         sys.exit(1)
+
+
+def pattern_to_bytes(pattern, origin, extension, settings={}):
+    """Write a pattern to an embroidery file and return the file's contents."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "pattern.%s" % extension)
+        write_pattern(file_path, pattern, origin, settings)
+
+        with open(file_path, 'rb') as output_file:
+            return output_file.read()
+
+
+def patterns_to_bytes(pattern, origin, extensions, processes=1):
+    """Write a pattern in several formats at once.
+
+    Each format is written in its own worker process, up to processes at a
+    time.  The files are returned in the same order as extensions.
+    """
+
+    processes = min(processes, len(extensions))
+
+    if processes <= 1:
+        results = [_write_format(extension, pattern, origin) for extension in extensions]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(pattern, origin)) as executor:
+            results = list(executor.map(_write_format, extensions))
+
+    files = []
+    for extension, (contents, duration) in zip(extensions, results):
+        debug.log(f"wrote {extension} file in {duration:.3f}s")
+        files.append(contents)
+
+    return files
+
+
+def _init_worker(pattern, origin):
+    global _worker_pattern
+    _worker_pattern = (pattern, origin)
+
+
+def _write_format(extension, pattern=None, origin=None):
+    if pattern is None:
+        pattern, origin = _worker_pattern
+
+    start = time.time()
+    contents = pattern_to_bytes(pattern, origin, extension)
+    return contents, time.time() - start
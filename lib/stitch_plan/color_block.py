@@ -3,38 +3,89 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
+from collections.abc import Sequence
 from typing import List
 
+import numpy as np
+
 from ..svg import PIXELS_PER_MM
 from ..threads import ThreadColor
 from ..utils.geometry import Point
-from .stitch import Stitch
+from .stitch import Stitch, tag_bit
+
+# Bits in ColorBlock.commands.  A stitch without any of them set is a normal
+# needle-down stitch.
+JUMP = 1
+STOP = 2
+TRIM = 4
+COLOR_CHANGE = 8
 
 
 class ColorBlock(object):
-    """Holds a set of stitches, all with the same thread color."""
+    """Holds a set of stitches, all with the same thread color.
+
+    Large designs can easily have hundreds of thousands of stitches, so we
+    don't keep a Stitch object around for each one of them.  Instead, the
+    stitches are stored in columns: a NumPy array of coordinates, a NumPy
+    array of command bits (JUMP, STOP, TRIM, COLOR_CHANGE) and a NumPy array
+    of tag ids.  Each distinct Stitch.tag_mask is only stored once.
+
+    Code that wants to work with Stitch objects can still iterate over the
+    ColorBlock or use ColorBlock.stitches.  The Stitch objects are created on
+    the fly, so changing them does not change the ColorBlock.
+    """
 
     def __init__(self, color=None, stitches=None):
         self.color = color
-        self.stitches = stitches or []
+        self._clear()
+
+        if stitches:
+            self.add_stitches(stitches)
+
+    def _clear(self, capacity=64):
+        self._length = 0
+        self._coordinates = np.empty((capacity, 2), dtype=np.float64)
+        self._commands = np.zeros(capacity, dtype=np.uint8)
+        self._tag_ids = np.zeros(capacity, dtype=np.uint32)
+        self._tag_masks = [0]
+        self._tag_mask_ids = {0: 0}
 
     def __iter__(self):
-        return iter(self.stitches)
+        for i in range(self._length):
+            yield self._make_stitch(i)
 
     def __len__(self):
-        return len(self.stitches)
+        return self._length
 
     def __repr__(self):
-        return "ColorBlock(%s, %s)" % (self.color, self.stitches)
+        return "ColorBlock(%s, %s)" % (self.color, list(self.stitches))
 
     def __getitem__(self, item):
-        return self.stitches[item]
+        if isinstance(item, slice):
+            return [self._make_stitch(i) for i in range(*item.indices(self._length))]
+
+        return self._make_stitch(self._normalize_index(item))
 
     def __delitem__(self, item):
-        del self.stitches[item]
+        if isinstance(item, slice):
+            indices = np.arange(self._length)[item]
+        else:
+            indices = [self._normalize_index(item)]
+
+        keep = np.ones(self._length, dtype=bool)
+        keep[indices] = False
+        self._select(keep)
 
     def __json__(self):
-        return dict(color=self.color, stitches=self.stitches)
+        return dict(color=self.color, stitches=list(self.stitches))
+
+    def __getstate__(self):
+        # Don't pickle the unused capacity at the end of the arrays.
+        state = dict(vars(self))
+        state['_coordinates'] = self.coordinates.copy()
+        state['_commands'] = self.commands.copy()
+        state['_tag_ids'] = self._tag_ids[:self._length].copy()
+        return state
 
     def has_color(self):
         return self._color is not None
@@ -52,37 +103,52 @@ class ColorBlock(object):
         else:
             self._color = ThreadColor(value)
 
+    @property
+    def stitches(self):
+        """A read-only, list-like view of this ColorBlock's stitches."""
+        return StitchList(self)
+
+    @stitches.setter
+    def stitches(self, stitches):
+        self.replace_stitches(stitches)
+
+    @property
+    def coordinates(self):
+        """The stitch coordinates as an (N, 2) array.  Do not modify."""
+        return self._coordinates[:self._length]
+
+    @property
+    def commands(self):
+        """The command bits of each stitch as an array.  Do not modify."""
+        return self._commands[:self._length]
+
     @property
     def last_stitch(self):
-        if self.stitches:
-            return self.stitches[-1]
+        if self._length:
+            return self._make_stitch(self._length - 1)
         else:
             return None
 
     @property
     def num_stitches(self):
         """Number of stitches in this color block."""
-        return len(self.stitches)
+        return self._length
 
     @property
     def estimated_thread(self):
-        previous_stitch = self.stitches[0]
-        length = 0
-        for stitch in self.stitches[1:]:
-            length += (stitch - previous_stitch).length()
-            previous_stitch = stitch
-        return length
+        segments = np.diff(self.coordinates, axis=0)
+        return float(np.sqrt((segments ** 2).sum(axis=1)).sum())
 
     @property
     def num_trims(self):
         """Number of trims in this color block."""
 
-        return sum(1 for stitch in self if stitch.trim)
+        return int(np.count_nonzero(self.commands & TRIM))
 
     @property
     def stop_after(self):
-        if self.last_stitch is not None:
-            return self.last_stitch.stop
+        if self._length:
+            return bool(self._commands[self._length - 1] & STOP)
         else:
             return False
 
@@ -90,10 +156,10 @@ class ColorBlock(object):
     def trim_after(self):
         # If there's a STOP, it will be at the end.  We still want to return
         # True.
-        for stitch in reversed(self.stitches):
-            if stitch.stop or stitch.jump:
+        for command in reversed(self.commands.tolist()):
+            if command & (STOP | JUMP):
                 continue
-            elif stitch.trim:
+            elif command & TRIM:
                 return True
             else:
                 break
@@ -101,76 +167,225 @@ class ColorBlock(object):
         return False
 
     def filter_duplicate_stitches(self, min_stitch_len=0.1):
-        if not self.stitches:
+        if not self._length:
             return
 
         if min_stitch_len is None:
             min_stitch_len = 0.1
-
-        stitches = [self.stitches[0]]
-        for stitch in self.stitches[1:]:
-            if stitches[-1].jump or stitch.stop or stitch.trim or stitch.color_change:
-                # Don't consider jumps, stops, color changes, or trims as candidates for filtering
-                pass
-            elif 'lock_stitch' in stitch.tags:
-                # do not filter specific stitches
-                pass
-            else:
-                length = (stitch - stitches[-1]).length()
-                if length <= min_stitch_len * PIXELS_PER_MM:
+        min_stitch_len = min_stitch_len * PIXELS_PER_MM
+
+        # Stitches that are never candidates for filtering: stops, trims and
+        # color changes, as well as lock stitches.
+        protected = (self.commands & (STOP | TRIM | COLOR_CHANGE)) != 0
+        lock_stitch = tag_bit('lock_stitch')
+        lock_stitch_tag_ids = [tag_id for tag_id, mask in enumerate(self._tag_masks) if mask & lock_stitch]
+        protected |= np.isin(self._tag_ids[:self._length], lock_stitch_tag_ids)
+
+        # Whether a stitch is a duplicate depends on the last stitch we kept,
+        # so this can't be vectorized.  Plain Python floats are still a lot
+        # faster than Stitch objects, though.
+        xs, ys = self.coordinates.T.tolist()
+        jumps = (self.commands & JUMP).tolist()
+        protected = protected.tolist()
+
+        keep = [0]
+        last_x, last_y = xs[0], ys[0]
+        for i in range(1, self._length):
+            if not jumps[keep[-1]] and not protected[i]:
+                length = ((xs[i] - last_x) ** 2 + (ys[i] - last_y) ** 2) ** 0.5
+                if length <= min_stitch_len:
                     # duplicate stitch, skip this one
                     continue
 
-            stitches.append(stitch)
+            keep.append(i)
+            last_x, last_y = xs[i], ys[i]
 
-        self.stitches = stitches
+        self._select(np.array(keep, dtype=np.intp))
 
     def add_stitch(self, *args, **kwargs):
         if not args:
             # They're adding a command, e.g. `color_block.add_stitch(stop=True)``.
             # Use the position from the last stitch.
-            if self.last_stitch:
-                args = (self.last_stitch.x, self.last_stitch.y)
+            if self._length:
+                args = tuple(self._coordinates[self._length - 1])
             else:
                 raise ValueError("internal error: can't add a command to an empty stitch block")
-            self.stitches.append(Stitch(*args, **kwargs))
+
         if isinstance(args[0], Stitch):
-            self.stitches.append(Stitch(*args, **kwargs))
+            stitch = Stitch(*args, **kwargs)
         elif isinstance(args[0], Point):
-            self.stitches.append(Stitch(args[0].x, args[0].y, *args[1:], **kwargs))
+            stitch = Stitch(args[0].x, args[0].y, *args[1:], **kwargs)
+        else:
+            stitch = Stitch(*args, **kwargs)
+
+        self._append([stitch.x], [stitch.y], [_stitch_commands(stitch)], [self._get_tag_id(stitch.tag_mask)])
 
     def add_stitches(self, stitches, *args, **kwargs):
+        if args or kwargs:
+            for stitch in stitches:
+                if isinstance(stitch, (Stitch, Point)):
+                    self.add_stitch(stitch, *args, **kwargs)
+                else:
+                    self.add_stitch(*stitch, *args, **kwargs)
+            return
+
+        # fast path: no attributes to override, so we can copy the stitches
+        # straight into our arrays
+        xs = []
+        ys = []
+        commands = []
+        tag_ids = []
         for stitch in stitches:
-            if isinstance(stitch, (Stitch, Point)):
-                self.add_stitch(stitch, *args, **kwargs)
+            if not isinstance(stitch, (Stitch, Point)):
+                stitch = Stitch(*stitch)
+
+            xs.append(stitch.x)
+            ys.append(stitch.y)
+
+            if isinstance(stitch, Stitch):
+                commands.append(_stitch_commands(stitch))
+                tag_ids.append(self._get_tag_id(stitch.tag_mask))
             else:
-                self.add_stitch(*stitch, *args, **kwargs)
+                commands.append(0)
+                tag_ids.append(0)
+
+        self._append(xs, ys, commands, tag_ids)
 
     def replace_stitches(self, stitches):
-        self.stitches = stitches
+        if isinstance(stitches, StitchList):
+            # a view of ourselves or another block; materialize it before we clear anything
+            stitches = list(stitches)
+
+        self._clear()
+        self.add_stitches(stitches)
 
     @property
     def bounding_box(self):
-        minx = min(stitch.x for stitch in self)
-        miny = min(stitch.y for stitch in self)
-        maxx = max(stitch.x for stitch in self)
-        maxy = max(stitch.y for stitch in self)
+        minx, miny = self.coordinates.min(axis=0)
+        maxx, maxy = self.coordinates.max(axis=0)
 
-        return minx, miny, maxx, maxy
+        return float(minx), float(miny), float(maxx), float(maxy)
 
     def make_offsets(self, offsets: List[Point]):
-        first_final_stitch = len(self.stitches)
-        while (first_final_stitch > 0 and self.stitches[first_final_stitch-1].is_terminator):
+        first_final_stitch = self._length
+        while (first_final_stitch > 0 and self._commands[first_final_stitch - 1] & (TRIM | STOP | COLOR_CHANGE)):
             first_final_stitch -= 1
         if first_final_stitch == 0:
             return self
-        final_stitches = self.stitches[first_final_stitch:]
-        block_stitches = self.stitches[:first_final_stitch]
 
         out = ColorBlock(self.color)
+        out._tag_masks = list(self._tag_masks)
+        out._tag_mask_ids = dict(self._tag_mask_ids)
+
+        block_coordinates = self._coordinates[:first_final_stitch]
+        block_commands = self._commands[:first_final_stitch]
+        block_tag_ids = self._tag_ids[:first_final_stitch]
+
         for i, offset in enumerate(offsets):
-            out.add_stitches([s.offset(offset) for s in block_stitches])
+            coordinates = block_coordinates + (offset.x, offset.y)
+            out._append(coordinates[:, 0], coordinates[:, 1], block_commands, block_tag_ids)
             if i != len(offsets) - 1:
                 out.add_stitch(trim=True)
-        out.add_stitches(final_stitches)
+
+        final = slice(first_final_stitch, self._length)
+        out._append(self._coordinates[final, 0], self._coordinates[final, 1], self._commands[final], self._tag_ids[final])
+
         return out
+
+    def _make_stitch(self, index):
+        x, y = self._coordinates[index].tolist()
+        commands = int(self._commands[index])
+        stitch = Stitch(x, y,
+                        jump=bool(commands & JUMP),
+                        stop=bool(commands & STOP),
+                        trim=bool(commands & TRIM),
+                        color_change=bool(commands & COLOR_CHANGE))
+        stitch.tag_mask = self._tag_masks[self._tag_ids[index]]
+        return stitch
+
+    def _normalize_index(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ColorBlock index out of range")
+        return index
+
+    def _get_tag_id(self, tag_mask):
+        tag_id = self._tag_mask_ids.get(tag_mask)
+
+        if tag_id is None:
+            tag_id = len(self._tag_masks)
+            self._tag_masks.append(tag_mask)
+            self._tag_mask_ids[tag_mask] = tag_id
+
+        return tag_id
+
+    def _append(self, xs, ys, commands, tag_ids):
+        count = len(xs)
+        if not count:
+            return
+
+        self._reserve(self._length + count)
+
+        new = slice(self._length, self._length + count)
+        self._coordinates[new, 0] = xs
+        self._coordinates[new, 1] = ys
+        self._commands[new] = commands
+        self._tag_ids[new] = tag_ids
+        self._length += count
+
+    def _reserve(self, length):
+        capacity = len(self._commands)
+        if length <= capacity:
+            return
+
+        # grow geometrically so that adding stitches one by one stays cheap
+        capacity = max(length, capacity * 2)
+        self._coordinates = np.resize(self._coordinates, (capacity, 2))
+        self._commands = np.resize(self._commands, capacity)
+        self._tag_ids = np.resize(self._tag_ids, capacity)
+
+    def _select(self, indices):
+        """Keep only the stitches selected by an index array or boolean mask."""
+
+        self._coordinates = self.coordinates[indices]
+        self._commands = self.commands[indices]
+        self._tag_ids = self._tag_ids[:self._length][indices]
+        self._length = len(self._commands)
+
+
+class StitchList(Sequence):
+    """A read-only list of the Stitches in a ColorBlock."""
+
+    def __init__(self, color_block):
+        self.color_block = color_block
+
+    def __len__(self):
+        return len(self.color_block)
+
+    def __getitem__(self, item):
+        return self.color_block[item]
+
+    def __iter__(self):
+        return iter(self.color_block)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __json__(self):
+        return list(self)
+
+
+def _stitch_commands(stitch):
+    commands = 0
+
+    if stitch.jump:
+        commands |= JUMP
+    if stitch.stop:
+        commands |= STOP
+    if stitch.trim:
+        commands |= TRIM
+    if stitch.color_change:
+        commands |= COLOR_CHANGE
+
+    return commands
@@ -7,49 +7,112 @@ from shapely import geometry as shgeo
 
 from ..utils.geometry import Point
 
+# Stitch tags are stored as a bitmask.  Each tag we know about has a fixed bit.
+# The bit positions end up in pickled stitches in the stitch plan cache, so
+# only ever append to this list!  Tags that aren't listed here still work:
+# they're assigned a bit the first time they're used.
+KNOWN_TAGS = (
+    "auto_fill",
+    "auto_fill_underlay",
+    "auto_fill_top",
+    "auto_fill_travel",
+    "fill_row",
+    "fill_row_start",
+    "fill_row_end",
+    "guided_fill",
+    "meander_fill",
+    "meander_fill_top",
+    "circular_fill",
+    "ripple_stitch",
+    "satin",
+    "satin_column",
+    "satin_column_underlay",
+    "satin_contour_underlay",
+    "satin_center_walk",
+    "satin_zigzag_underlay",
+    "satin_column_edge",
+    "satin_split_stitch",
+    "e_stitch",
+    "s_stitch",
+    "lock_stitch",
+    "pattern_point",
+)
+
+_tag_names = list(KNOWN_TAGS)
+_tag_bits = {tag: 1 << bit for bit, tag in enumerate(_tag_names)}
+_KNOWN_TAGS_MASK = (1 << len(KNOWN_TAGS)) - 1
+
+
+def tag_bit(tag):
+    """Return the bit used for this tag in Stitch.tag_mask."""
+
+    bit = _tag_bits.get(tag)
+    if bit is None:
+        bit = 1 << len(_tag_names)
+        _tag_names.append(tag)
+        _tag_bits[tag] = bit
+
+    return bit
+
+
+def tag_mask(tags):
+    """Return a bitmask with the bits of all of the given tags set."""
+
+    mask = 0
+    for tag in tags:
+        mask |= tag_bit(tag)
+
+    return mask
+
+
+def tag_names(mask):
+    """Return the tags whose bits are set in the given bitmask."""
+
+    return frozenset(tag for bit, tag in enumerate(_tag_names) if mask >> bit & 1)
+
 
 class Stitch(Point):
     """A stitch is a Point with extra information telling how to sew it."""
 
+    # A design can easily have hundreds of thousands of stitches, so we don't
+    # want each of them to carry a __dict__ and a set of tags around.
+    __slots__ = ('color', 'jump', 'stop', 'trim', 'color_change', 'tag_mask')
+
     def __init__(self, x, y=None, color=None, jump=False, stop=False, trim=False, color_change=False, tags=None):
-        # DANGER: if you add new attributes, you MUST also set their default
-        # values in __new__() below.  Otherwise, cached stitch plans can be
-        # loaded and create objects without those properties defined, because
-        # unpickling does not call __init__()!
+        # DANGER: if you add new attributes, you MUST also handle them in
+        # __getstate__() and __setstate__() below.  Otherwise, cached stitch
+        # plans can be loaded and create objects without those properties
+        # defined, because unpickling does not call __init__()!
 
-        base_stitch = None
         if isinstance(x, Stitch):
             # Allow creating a Stitch from another Stitch.  Attributes passed as
             # arguments will override any existing attributes.
             base_stitch = x
-            self.x: float = base_stitch.x
-            self.y: float = base_stitch.y
-        elif isinstance(x, (Point, shgeo.Point)):
-            # Allow creating a Stitch from a Point
-            point = x
-            self.x: float = point.x
-            self.y: float = point.y
+            self.x = base_stitch.x
+            self.y = base_stitch.y
+            self.color = color or base_stitch.color
+            self.jump = jump or base_stitch.jump
+            self.stop = stop or base_stitch.stop
+            self.trim = trim or base_stitch.trim
+            self.color_change = color_change or base_stitch.color_change
+            self.tag_mask = base_stitch.tag_mask
         else:
-            Point.__init__(self, x, y)
-
-        self._set('color', color, base_stitch)
-        self._set('jump', jump, base_stitch)
-        self._set('trim', trim, base_stitch)
-        self._set('stop', stop, base_stitch)
-        self._set('color_change', color_change, base_stitch)
-
-        self.tags = set()
-        self.add_tags(tags or [])
-        if base_stitch is not None:
-            self.add_tags(base_stitch.tags)
-
-    def __new__(cls, *args, **kwargs):
-        instance = super().__new__(cls)
-
-        # Set default values for any new attributes here (see note in __init__() above)
-        # instance.foo = None
-
-        return instance
+            if isinstance(x, (Point, shgeo.Point)):
+                # Allow creating a Stitch from a Point
+                self.x = float(x.x)
+                self.y = float(x.y)
+            else:
+                Point.__init__(self, x, y)
+
+            self.color = color
+            self.jump = jump
+            self.stop = stop
+            self.trim = trim
+            self.color_change = color_change
+            self.tag_mask = 0
+
+        if tags:
+            self.tag_mask |= tag_mask(tags)
 
     def __repr__(self):
         return "Stitch(%s, %s, %s, %s, %s, %s, %s)" % (self.x,
@@ -60,21 +123,17 @@ class Stitch(Point):
                                                        "STOP" if self.stop else " ",
                                                        "COLOR CHANGE" if self.color_change else " ")
 
-    def _set(self, attribute, value, base_stitch):
-        # Set an attribute.  If the caller passed a Stitch object, use its value, unless
-        # they overrode it with arguments.
-        if base_stitch is not None:
-            setattr(self, attribute, getattr(base_stitch, attribute))
-        if value or base_stitch is None:
-            setattr(self, attribute, value)
-
     @property
     def is_terminator(self) -> bool:
         return self.trim or self.stop or self.color_change
 
+    @property
+    def tags(self):
+        """The tags of this stitch as a (read-only) set.  Use add_tag() to add tags."""
+        return tag_names(self.tag_mask)
+
     def add_tags(self, tags):
-        for tag in tags:
-            self.add_tag(tag)
+        self.tag_mask |= tag_mask(tags)
 
     def add_tag(self, tag):
         """Store arbitrary information about a stitch.
@@ -83,19 +142,18 @@ class Stitch(Point):
         used by other parts of the code to keep track of where a Stitch came
         from.  The Stitch treats tags as opaque.
 
-        Use strings as tags.  Python automatically optimizes this kind of
-        usage of strings, and it doesn't have to constantly do string
-        comparisons.  More details here:
-
-          https://stackabuse.com/guide-to-string-interning-in-python
+        Use strings as tags.  Each distinct tag is assigned a bit in
+        Stitch.tag_mask, so checking for a tag is just a bitwise AND.
         """
-        self.tags.add(tag)
+        self.tag_mask |= tag_bit(tag)
 
     def has_tag(self, tag):
-        return tag in self.tags
+        return bool(self.tag_mask & tag_bit(tag))
 
     def copy(self):
-        return Stitch(self.x, self.y, self.color, self.jump, self.stop, self.trim, self.color_change, self.tags)
+        stitch = Stitch(self.x, self.y, self.color, self.jump, self.stop, self.trim, self.color_change)
+        stitch.tag_mask = self.tag_mask
+        return stitch
 
     def offset(self, offset: Point):
         out = self.copy()
@@ -104,15 +162,39 @@ class Stitch(Point):
         return out
 
     def __json__(self):
-        attributes = dict(vars(self))
-        attributes['tags'] = list(attributes['tags'])
-        return attributes
+        return dict(x=self.x,
+                    y=self.y,
+                    color=self.color,
+                    jump=self.jump,
+                    stop=self.stop,
+                    trim=self.trim,
+                    color_change=self.color_change,
+                    tags=sorted(self.tags))
 
     def __getstate__(self):
-        # This is used by pickle.  We want to sort the tag list so that the
-        # pickled representation is stable, since it's used to generate cache
-        # keys.
-        state = self.__json__()
-        state['tags'].sort()
-
-        return state
+        # This is used by pickle.  The pickled representation needs to be
+        # stable, since it's used to generate cache keys.  Bits of tags we
+        # don't know about at import time depend on the order in which tags
+        # were first used, so those are stored by name instead.
+        extra_tags = ()
+        if self.tag_mask & ~_KNOWN_TAGS_MASK:
+            extra_tags = tuple(sorted(tag_names(self.tag_mask & ~_KNOWN_TAGS_MASK)))
+
+        return (self.x, self.y, self.color, self.jump, self.stop, self.trim, self.color_change,
+                self.tag_mask & _KNOWN_TAGS_MASK, extra_tags)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # a stitch pickled by an older version of Ink/Stitch
+            state = dict(state)
+            tags = state.pop('tags', ())
+            for attribute in self.__slots__:
+                setattr(self, attribute, state.get(attribute, False))
+            self.x = state['x']
+            self.y = state['y']
+            self.color = state.get('color')
+            self.tag_mask = tag_mask(tags)
+        else:
+            (self.x, self.y, self.color, self.jump, self.stop, self.trim, self.color_change,
+             self.tag_mask, extra_tags) = state
+            self.tag_mask |= tag_mask(extra_tags)
@@ -10,6 +10,10 @@ from itertools import chain, groupby
 import warnings
 
 import networkx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
 from shapely import geometry as shgeo
 from shapely.ops import snap
 from shapely.strtree import STRtree
@@ -86,37 +90,94 @@ def auto_fill(shape,
     return result
 
 
-def which_outline(shape, coords):
-    """return the index of the outline on which the point resides
+class ShapeOutlines(object):
+    """The outlines of a fill shape, ready to locate lots of points on them.
 
-    Index 0 is the outer boundary of the fill region.  1+ are the
-    outlines of the holes.
+    Index 0 is the outer boundary of the fill region.  1+ are the outlines
+    of the holes.
+
+    Locating a point means finding the outline it's on (the closest one, to
+    be robust against floating point errors) and its projection, the
+    distance along that outline at which it resides.  Auto-fill needs this
+    for every endpoint of every row, so we do it for all of them at once
+    with NumPy instead of asking Shapely one point and one outline at a
+    time.
     """
 
-    # I'd use an intersection check, but floating point errors make it
-    # fail sometimes.
+    def __init__(self, shape):
+        self.geoms = list(ensure_multi_line_string(shape.boundary).geoms)
 
-    point = shgeo.Point(*coords)
-    outlines = ensure_multi_line_string(shape.boundary).geoms
-    outline_indices = list(range(len(outlines)))
-    closest = min(outline_indices,
-                  key=lambda index: outlines[index].distance(point))
+        starts = []
+        ends = []
+        outline_indices = []
+        for outline_index, outline in enumerate(self.geoms):
+            coords = np.asarray(outline.coords)[:, :2]
+            starts.append(coords[:-1])
+            ends.append(coords[1:])
+            outline_indices.append(np.full(len(coords) - 1, outline_index))
 
-    return closest
+        self.starts = np.concatenate(starts)
+        self.vectors = np.concatenate(ends) - self.starts
+        self.outline_indices = np.concatenate(outline_indices)
 
+        self.lengths_squared = (self.vectors ** 2).sum(axis=1)
+        self.lengths = np.sqrt(self.lengths_squared)
 
-def project(shape, coords, outline_index):
-    """project the point onto the specified outline
+        # how far along its outline each segment begins
+        outline_starts = np.searchsorted(self.outline_indices, self.outline_indices)
+        cumulative_lengths = np.concatenate(([0.0], np.cumsum(self.lengths)))
+        self.offsets = cumulative_lengths[:-1] - cumulative_lengths[outline_starts]
 
-    This returns the distance along the outline at which the point resides.
-    """
+    def locate(self, points, outline_index=None):
+        """Find the outline and projection of each point.
+
+        If outline_index is given, project all points onto that outline.
+
+        Returns: (outline indices, projections) as NumPy arrays
+        """
+
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        if outline_index is None:
+            segments = slice(None)
+        else:
+            segment_indices = np.flatnonzero(self.outline_indices == outline_index)
+            segments = slice(segment_indices[0], segment_indices[-1] + 1)
+
+        starts = self.starts[segments]
+        vectors = self.vectors[segments]
+        lengths_squared = self.lengths_squared[segments]
+        has_length = lengths_squared > 0
+        safe_lengths_squared = np.where(has_length, lengths_squared, 1.0)
+
+        nearest_segments = np.empty(len(points), dtype=np.intp)
+        factors = np.empty(len(points))
+
+        # points x segments can get big, so go a chunk of points at a time
+        chunk_size = max(1, 2 ** 20 // len(starts))
+        for chunk in range(0, len(points), chunk_size):
+            check_stop_flag()
 
-    outline = ensure_multi_line_string(shape.boundary).geoms[outline_index]
-    return outline.project(shgeo.Point(*coords))
+            chunk_points = points[chunk:chunk + chunk_size]
+            offsets = chunk_points[:, np.newaxis, :] - starts
+            chunk_factors = (offsets * vectors).sum(axis=2) / safe_lengths_squared
+            chunk_factors = np.where(has_length, np.clip(chunk_factors, 0.0, 1.0), 0.0)
+            distances = ((offsets - chunk_factors[:, :, np.newaxis] * vectors) ** 2).sum(axis=2)
+
+            # argmin picks the first segment on a tie, just like Shapely's
+            # project() does
+            nearest = distances.argmin(axis=1)
+            nearest_segments[chunk:chunk + chunk_size] = nearest
+            factors[chunk:chunk + chunk_size] = chunk_factors[np.arange(len(nearest)), nearest]
+
+        outline_indices = self.outline_indices[segments][nearest_segments]
+        projections = self.offsets[segments][nearest_segments] + factors * self.lengths[segments][nearest_segments]
+
+        return outline_indices, projections
 
 
 @debug.time
-def build_fill_stitch_graph(shape, segments, starting_point=None, ending_point=None):
+def build_fill_stitch_graph(shape, segments, starting_point=None, ending_point=None, outlines=None):
     """build a graph representation of the grating segments
 
     This function builds a specialized graph (as in graph theory) that will
@@ -147,11 +208,18 @@ def build_fill_stitch_graph(shape, segments, starting_point=None, ending_point=N
     to stitch those spots twice.  This may be true, but it also ensures
     that every node has 4 edges touching it, ensuring that a valid stitch
     path must exist.
+
+    If the caller already has the ShapeOutlines of the shape, they can pass
+    them in.  The graph keeps them in graph.graph['outlines'] so that
+    build_travel_graph() can use them too.
     """
 
     debug.add_layer("auto-fill fill stitch")
 
-    graph = networkx.MultiGraph()
+    if outlines is None:
+        outlines = ShapeOutlines(shape)
+
+    graph = networkx.MultiGraph(outlines=outlines)
 
     # First, add the grating segments as edges.  We'll use the coordinates
     # of the endpoints as nodes, which networkx will add automatically.
@@ -162,27 +230,27 @@ def build_fill_stitch_graph(shape, segments, starting_point=None, ending_point=N
 
         check_stop_flag()
 
-    tag_nodes_with_outline_and_projection(graph, shape, graph.nodes())
+    tag_nodes_with_outline_and_projection(graph, outlines, list(graph.nodes()))
     add_edges_between_outline_nodes(graph, duplicate_every_other=True)
 
     if starting_point:
-        insert_node(graph, shape, starting_point)
+        insert_node(graph, outlines, starting_point)
 
     if ending_point:
-        insert_node(graph, shape, ending_point)
+        insert_node(graph, outlines, ending_point)
 
     debug.log_graph(graph, "graph")
 
     return graph
 
 
-def insert_node(graph, shape, point):
+def insert_node(graph, outlines, point):
     """Add node to graph, splitting one of the outline edges"""
 
     point = tuple(point)
-    outline = which_outline(shape, point)
-    projection = project(shape, point, outline)
-    projected_point = ensure_multi_line_string(shape.boundary).geoms[outline].interpolate(projection)
+    outline_indices, projections = outlines.locate([point])
+    outline = int(outline_indices[0])
+    projected_point = outlines.geoms[outline].interpolate(float(projections[0]))
     node = (projected_point.x, projected_point.y)
 
     edges = []
@@ -195,41 +263,48 @@ def insert_node(graph, shape, point):
     graph.remove_edge(*edge, key="outline")
     graph.add_edge(edge[0], node, key="outline", **data)
     graph.add_edge(node, edge[1], key="outline", **data)
-    tag_nodes_with_outline_and_projection(graph, shape, nodes=[node])
+    tag_nodes_with_outline_and_projection(graph, outlines, nodes=[node])
 
 
-def tag_nodes_with_outline_and_projection(graph, shape, nodes):
-    for node in nodes:
-        outline_index = which_outline(shape, node)
-        outline_projection = project(shape, node, outline_index)
+def tag_nodes_with_outline_and_projection(graph, outlines, nodes):
+    if not nodes:
+        return
 
-        graph.add_node(node, outline=outline_index, projection=outline_projection)
+    outline_indices, projections = outlines.locate(nodes)
+    for node, outline_index, projection in zip(nodes, outline_indices.tolist(), projections.tolist()):
+        graph.add_node(node, outline=outline_index, projection=projection)
 
-        check_stop_flag()
 
+def add_boundary_travel_nodes(graph, outlines):
+    for outline_index, outline in enumerate(outlines.geoms):
+        coords = np.asarray(outline.coords)[:, :2]
 
-def add_boundary_travel_nodes(graph, shape):
-    outlines = ensure_multi_line_string(shape.boundary).geoms
-    for outline_index, outline in enumerate(outlines):
-        prev = None
-        for point in outline.coords:
-            point = shgeo.Point(point)
-            if prev is not None:
-                # Subdivide long straight line segments.  Otherwise we may not
-                # have a node near the user's chosen starting or ending point
-                length = point.distance(prev)
-                segment = shgeo.LineString((prev, point))
-                if length > 1:
-                    # Just plot a point every pixel, that should be plenty of
-                    # resolution.  A pixel is around a quarter of a millimeter.
-                    for i in range(1, int(length)):
-                        subpoint = segment.interpolate(i)
-                        graph.add_node((subpoint.x, subpoint.y), projection=outline.project(subpoint), outline=outline_index)
+        # Subdivide long straight line segments.  Otherwise we may not have a
+        # node near the user's chosen starting or ending point.  Just plot a
+        # point every pixel, that should be plenty of resolution.  A pixel is
+        # around a quarter of a millimeter.
+        vectors = np.diff(coords, axis=0)
+        lengths = np.sqrt((vectors ** 2).sum(axis=1))
+        subdivisions = np.where(lengths > 1, lengths.astype(int) - 1, 0)
 
-            check_stop_flag()
+        # Each vertex comes right after the points that subdivide the
+        # segment leading up to it.
+        counts = np.concatenate(([1], subdivisions + 1))
+        segments = np.repeat(np.arange(len(coords)) - 1, counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        is_vertex = steps == counts[segments + 1]
+
+        points = np.empty((len(segments), 2))
+        points[is_vertex] = coords[segments[is_vertex] + 1]
+        subpoints = ~is_vertex
+        fractions = steps[subpoints] / lengths[segments[subpoints]]
+        points[subpoints] = coords[segments[subpoints]] + fractions[:, np.newaxis] * vectors[segments[subpoints]]
 
-            graph.add_node((point.x, point.y), projection=outline.project(point), outline=outline_index)
-            prev = point
+        _, projections = outlines.locate(points, outline_index)
+        for point, projection in zip(points.tolist(), projections.tolist()):
+            graph.add_node(tuple(point), projection=projection, outline=outline_index)
+
+        check_stop_flag()
 
 
 def add_edges_between_outline_nodes(graph, duplicate_every_other=False):
@@ -306,7 +381,8 @@ def build_travel_graph(fill_stitch_graph, shape, fill_stitch_angle, underpath):
     how close they are to the boundary.
     """
 
-    graph = networkx.MultiGraph()
+    outlines = fill_stitch_graph.graph.get('outlines') or ShapeOutlines(shape)
+    graph = networkx.MultiGraph(outlines=outlines)
 
     # Add all the nodes from the main graph.  This will be all of the endpoints
     # of the rows of stitches.  Every node will be on the outline of the shape.
@@ -318,9 +394,9 @@ def build_travel_graph(fill_stitch_graph, shape, fill_stitch_angle, underpath):
 
         # This will ensure that a path traveling inside the shape can reach its
         # target on the outline, which will be one of the points added above.
-        tag_nodes_with_outline_and_projection(graph, shape, boundary_points)
+        tag_nodes_with_outline_and_projection(graph, outlines, boundary_points)
     else:
-        add_boundary_travel_nodes(graph, shape)
+        add_boundary_travel_nodes(graph, outlines)
 
     add_edges_between_outline_nodes(graph)
 
@@ -474,11 +550,47 @@ def build_travel_edges(shape, fill_angle):
     return endpoints, chain(diagonal_edges.geoms, vertical_edges.geoms)
 
 
-def nearest_node(nodes, point, attr=None):
-    point = shgeo.Point(*point)
-    nearest = min(nodes, key=lambda node: shgeo.Point(*node).distance(point))
+class NodeLocator(object):
+    """Find the node nearest to a point, using a KD-tree.
 
-    return nearest
+    If several nodes are equally close, the first one wins, just like with
+    min() over the nodes.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        self.tree = cKDTree(np.array(self.nodes, dtype=float).reshape(-1, 2))
+
+    def nearest(self, point):
+        point = (float(point[0]), float(point[1]))
+        distance, index = self.tree.query(point)
+
+        # look for ties, allowing for rounding errors in the distances
+        candidates = self.tree.query_ball_point(point, distance * (1 + 1e-9) + 1e-12)
+        return self.nodes[min(candidates, default=index)]
+
+
+def get_node_locator(graph, outline_only=False):
+    """Get a NodeLocator for the graph's nodes.
+
+    The locator is built once and stored in the graph, so that all lookups
+    share it.  If outline_only is True, only nodes on an outline of the shape
+    are considered.
+    """
+
+    name = 'outline_node_locator' if outline_only else 'node_locator'
+    node_count, locator = graph.graph.get(name, (None, None))
+
+    # rebuild it if nodes have been added since
+    if node_count != len(graph):
+        if outline_only:
+            nodes = [node for node, outline in graph.nodes(data="outline") if outline is not None]
+        else:
+            nodes = graph.nodes
+        locator = NodeLocator(nodes)
+        graph.graph[name] = (len(graph), locator)
+
+    return locator
 
 
 @debug.time
@@ -504,15 +616,16 @@ def find_stitch_path(graph, travel_graph, starting_point=None, ending_point=None
     the order of most-recently-visited first.
     """
 
+    node_locator = get_node_locator(graph)
     graph = graph.copy()
 
     if not starting_point:
         starting_point = list(graph.nodes.keys())[0]
 
-    starting_node = nearest_node(graph, starting_point)
+    starting_node = node_locator.nearest(starting_point)
 
     if ending_point:
-        ending_node = nearest_node(graph, ending_point)
+        ending_node = node_locator.nearest(ending_point)
     else:
         ending_point = starting_point
         ending_node = starting_node
@@ -552,7 +665,7 @@ def find_stitch_path(graph, travel_graph, starting_point=None, ending_point=None
     # If the starting and/or ending point falls far away from the end of a row
     # of stitches (like can happen at the top of a square), then we need to
     # add travel stitch to that point.
-    real_start = nearest_node(travel_graph, starting_point)
+    real_start = get_node_locator(travel_graph).nearest(starting_point)
     path.insert(0, PathEdge((real_start, starting_node), key="outline"))
 
     # We're willing to start inside the shape, since we'll just cover the
@@ -560,8 +673,7 @@ def find_stitch_path(graph, travel_graph, starting_point=None, ending_point=None
     # relevant in the case that the user specifies an underlay with an inset
     # value, because the starting point (and possibly ending point) can be
     # inside the shape.
-    outline_nodes = [node for node, outline in travel_graph.nodes(data="outline") if outline is not None]
-    real_end = nearest_node(outline_nodes, ending_point)
+    real_end = get_node_locator(travel_graph, outline_only=True).nearest(ending_point)
     path.append(PathEdge((ending_node, real_end), key="outline"))
 
     check_stop_flag()
@@ -627,11 +739,115 @@ def collapse_sequential_outline_edges(path, graph):
     return new_path
 
 
+class SparseTravelGraph(object):
+    """The travel graph, compiled into a sparse matrix for fast shortest paths.
+
+    travel() needs a shortest path through the travel graph for every
+    travel edge, and networkx's pure Python Dijkstra dominated the run time
+    for large fills.  Instead, we number the nodes once and store the edge
+    weights in a CSR matrix, which scipy's compiled Dijkstra can work with.
+
+    Parallel edges are combined into one entry with the lowest weight, which
+    is the weight networkx's shortest_path() would use.  Edges without a
+    weight count as 1, like in networkx.
+
+    Removing an edge doesn't change the structure of the matrix.  We just
+    set the entry to the lowest weight among the remaining parallel edges,
+    or to infinity if there aren't any left.
+    """
+
+    def __init__(self, graph):
+        self.nodes = list(graph.nodes)
+        self.node_indices = {node: index for index, node in enumerate(self.nodes)}
+
+        # (index1, index2) with index1 < index2 -> {key: weight}
+        self.edge_weights = {}
+        for start, end, key, weight in graph.edges(keys=True, data='weight', default=1):
+            start = self.node_indices[start]
+            end = self.node_indices[end]
+            if start != end:
+                self.edge_weights.setdefault((min(start, end), max(start, end)), {})[key] = weight
+
+        pairs = np.array(list(self.edge_weights.keys()), dtype=np.intp).reshape(-1, 2)
+        weights = np.array([min(weights.values()) for weights in self.edge_weights.values()], dtype=float)
+
+        # each edge goes in both directions
+        rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        columns = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        order = np.lexsort((columns, rows))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(self.nodes)))))
+
+        # use the index type scipy's csgraph works with, so that it doesn't
+        # have to convert the matrix on every call
+        self.matrix = csr_matrix((np.concatenate((weights, weights))[order],
+                                  columns[order].astype(np.int32),
+                                  indptr.astype(np.int32)),
+                                 shape=(len(self.nodes), len(self.nodes)))
+
+        self.total_weight = weights.sum()
+
+        # where each pair's two entries ended up in self.matrix.data
+        positions = np.empty(len(order), dtype=np.intp)
+        positions[order] = np.arange(len(order))
+        self.positions = dict(zip(self.edge_weights.keys(), zip(positions[:len(pairs)].tolist(), positions[len(pairs):].tolist())))
+
+    def remove_edges_from(self, edges):
+        """Remove (start, end, key) edges, ignoring edges that don't exist."""
+
+        for start, end, key in edges:
+            start = self.node_indices.get(start)
+            end = self.node_indices.get(end)
+            if start is None or end is None:
+                continue
+
+            pair = (min(start, end), max(start, end))
+            weights = self.edge_weights.get(pair)
+            if not weights or weights.pop(key, None) is None:
+                continue
+
+            weight = min(weights.values(), default=np.inf)
+            for position in self.positions[pair]:
+                self.matrix.data[position] = weight
+
+    def shortest_path(self, start, end):
+        """Return the list of nodes on the shortest path from start to end."""
+
+        start_index = self.node_indices[start]
+        end_index = self.node_indices[end]
+
+        # Most travel is short, so searching the whole graph every time would
+        # be wasteful.  Dijkstra's results are exact for all nodes closer than
+        # the limit, so we start with a small search radius and widen it until
+        # we find the end node.
+        limit = max(InkstitchPoint(*start).distance(InkstitchPoint(*end)), 1.0)
+        while True:
+            distances, predecessors = dijkstra(self.matrix, directed=True, indices=start_index,
+                                               return_predecessors=True, limit=limit)
+            if np.isfinite(distances[end_index]):
+                break
+            elif limit == np.inf:
+                raise networkx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+
+            # No path can be longer than all edges together.
+            limit *= 4
+            if limit > self.total_weight:
+                limit = np.inf
+
+        path = [end_index]
+        while path[-1] != start_index:
+            path.append(predecessors[path[-1]])
+
+        return [self.nodes[index] for index in reversed(path)]
+
+
 def travel(shape, travel_graph, edge, running_stitch_length, running_stitch_tolerance, skip_last, underpath):
-    """Create stitches to get from one point on an outline of the shape to another."""
+    """Create stitches to get from one point on an outline of the shape to another.
+
+    travel_graph is a SparseTravelGraph.
+    """
 
     start, end = edge
-    path = networkx.shortest_path(travel_graph, start, end, weight='weight')
+    path = travel_graph.shortest_path(start, end)
     if underpath and path != (start, end):
         path = smooth_path(path, 2)
     else:
@@ -664,6 +880,7 @@ def travel(shape, travel_graph, edge, running_stitch_length, running_stitch_tole
 def path_to_stitches(shape, path, travel_graph, fill_stitch_graph, angle, row_spacing, max_stitch_length, running_stitch_length,
                      running_stitch_tolerance, staggers, skip_last, underpath):
     path = collapse_sequential_outline_edges(path, fill_stitch_graph)
+    travel_graph = SparseTravelGraph(travel_graph)
 
     stitches = []
 
@@ -13,9 +13,9 @@ from ..utils.geometry import Point as InkstitchPoint
 from ..utils.geometry import (ensure_geometry_collection,
                               ensure_multi_line_string, reverse_line_string)
 from ..utils.threading import check_stop_flag
-from .auto_fill import (auto_fill, build_fill_stitch_graph, build_travel_graph,
-                        collapse_sequential_outline_edges, find_stitch_path,
-                        graph_is_valid, travel)
+from .auto_fill import (SparseTravelGraph, auto_fill, build_fill_stitch_graph,
+                        build_travel_graph, collapse_sequential_outline_edges,
+                        find_stitch_path, graph_is_valid, travel)
 
 
 def guided_fill(shape,
@@ -65,6 +65,7 @@ def path_to_stitches(shape, path, travel_graph, fill_stitch_graph,
                      stitch_length, running_stitch_length, running_stitch_tolerance, skip_last,
                      underpath):
     path = collapse_sequential_outline_edges(path, fill_stitch_graph)
+    travel_graph = SparseTravelGraph(travel_graph)
 
     stitches = []
 
@@ -110,7 +110,7 @@ def generate_meander_path(graph, start, end, rng):
     graph_nodes = set(graph) - set(path)
 
     edges_to_consider = list(path_edges)
-    meander_path = path_edges
+    meander_path = MeanderPath(path)
     while edges_to_consider:
         while edges_to_consider:
             check_stop_flag()
@@ -118,55 +118,158 @@ def generate_meander_path(graph, start, end, rng):
             edge = poprandom(edges_to_consider, rng)
             edges_to_consider.extend(replace_edge(meander_path, edge, graph, graph_nodes))
 
-        edge_pairs = list(zip(meander_path[:-1], meander_path[1:]))
-        while edge_pairs:
+        # We pick pairs of consecutive edges in the path at random, exactly
+        # as poprandom() would from list(zip(path_edges[:-1], path_edges[1:])),
+        # so that the meander for a given random seed stays the same.  Rather
+        # than building that list, we remember which of its items poprandom()
+        # would have moved, and look up the others in the path by position.
+        num_edge_pairs = len(meander_path) - 2
+        moved_edge_pairs = {}
+        while num_edge_pairs > 0:
             check_stop_flag()
 
-            edge1, edge2 = poprandom(edge_pairs, rng)
+            index = int(round(next(rng) * (num_edge_pairs - 1)))
+            edge_pair_index = moved_edge_pairs.get(index, index)
+            num_edge_pairs -= 1
+            if index < num_edge_pairs:
+                moved_edge_pairs[index] = moved_edge_pairs.get(num_edge_pairs, num_edge_pairs)
+
+            edge1, edge2 = meander_path.edge_pair(edge_pair_index)
             new_edges = replace_edge_pair(meander_path, edge1, edge2, graph, graph_nodes)
             if new_edges:
                 edges_to_consider.extend(new_edges)
                 break
 
     debug.log_graph(graph, "remaining graph", "#FF0000")
-    points = path_to_points(meander_path)
+    points = meander_path.nodes()
     debug.log_line_string(LineString(points), "meander path", "#00FF00")
 
     return points
 
 
+class MeanderPath:
+    """The meander path, as a list of graph nodes split up into chunks.
+
+    The path never visits a node twice, so we can remember which chunk each
+    node is in.  Replacing an edge or a pair of edges with a longer detour
+    only changes one chunk, and finding the node at a given position only
+    has to count chunks, so neither gets slower as the path grows the way a
+    plain list would.
+    """
+
+    CHUNK_SIZE = 256
+
+    def __init__(self, nodes):
+        self.chunks = [list(nodes[i:i + self.CHUNK_SIZE]) for i in range(0, len(nodes), self.CHUNK_SIZE)]
+        self.chunk_by_node = {node: chunk for chunk in self.chunks for node in chunk}
+        self.length = len(nodes)
+
+    def __len__(self):
+        return self.length
+
+    def nodes(self):
+        return [node for chunk in self.chunks for node in chunk]
+
+    def edge_pair(self, index):
+        """Get the pair of consecutive edges that starts at the index-th node."""
+
+        nodes = []
+        for chunk in self.chunks:
+            if index < len(chunk):
+                nodes.extend(chunk[index:index + 3 - len(nodes)])
+                index = 0
+                if len(nodes) == 3:
+                    break
+            else:
+                index -= len(chunk)
+
+        return (nodes[0], nodes[1]), (nodes[1], nodes[2])
+
+    def replace(self, edges, new_path):
+        """Replace consecutive edges in the path with new_path.
+
+        new_path must start and end at the same nodes as edges.
+        """
+
+        for start, end in edges[1:]:
+            self.chunk_by_node.pop(start).remove(start)
+            self.length -= 1
+
+        chunk = self.chunk_by_node[edges[0][0]]
+        index = chunk.index(edges[0][0]) + 1
+        new_nodes = [end for start, end in new_path[:-1]]
+        chunk[index:index] = new_nodes
+        self.length += len(new_nodes)
+        for node in new_nodes:
+            self.chunk_by_node[node] = chunk
+
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self._split(chunk)
+
+    def _split(self, chunk):
+        chunk_index = next(i for i, other in enumerate(self.chunks) if other is chunk)
+        new_chunk = chunk[self.CHUNK_SIZE:]
+        del chunk[self.CHUNK_SIZE:]
+        self.chunks.insert(chunk_index + 1, new_chunk)
+        for node in new_chunk:
+            self.chunk_by_node[node] = new_chunk
+
+
+def find_detour(graph, graph_nodes, source, target, min_edges, cutoff):
+    """Find a path from source to target through nodes in graph_nodes.
+
+    Return the first path with more than min_edges edges and at most cutoff
+    edges, as a list of edges, or None if there isn't one.
+
+    The search only looks at the neighbors of the nodes it visits, rather
+    than building a subgraph for each call.  It finds paths in exactly the
+    same order as nx.all_simple_edge_paths() would in
+    graph.subgraph(graph_nodes | {source, target}), so the meander for a
+    given random seed doesn't change.
+    """
+
+    adjacency = graph.adj
+    path = [source]
+    visited = {source}
+    neighbors = [iter(adjacency[source])]
+    while neighbors:
+        next_node = next((node for node in neighbors[-1]
+                          if node not in visited and (node in graph_nodes or node == target)), None)
+        if next_node is None:
+            neighbors.pop()
+            visited.discard(path.pop())
+        elif next_node == target:
+            if len(path) > min_edges:
+                path.append(target)
+                return list(zip(path[:-1], path[1:]))
+        elif len(path) < cutoff:
+            path.append(next_node)
+            visited.add(next_node)
+            neighbors.append(iter(adjacency[next_node]))
+
+    return None
+
+
 def replace_edge(path, edge, graph, graph_nodes):
-    subgraph = graph.subgraph(graph_nodes | set(edge))
-    new_path = None
-    for new_path in nx.all_simple_edge_paths(subgraph, edge[0], edge[1], 7):
-        if len(new_path) > 1:
-            break
-    if new_path is None or len(new_path) == 1:
+    new_path = find_detour(graph, graph_nodes, edge[0], edge[1], 1, 7)
+    if new_path is None:
         return []
-    i = path.index(edge)
-    path[i:i + 1] = new_path
+    path.replace([edge], new_path)
     graph.remove_edges_from(new_path)
     # do I need to remove the last one too?
     graph_nodes.difference_update(start for start, end in new_path)
-    # debug.log(f"found new path of length {len(new_path)} at position {i}")
 
     return new_path
 
 
 def replace_edge_pair(path, edge1, edge2, graph, graph_nodes):
-    subgraph = graph.subgraph(graph_nodes | {edge1[0], edge2[1]})
-    new_path = None
-    for new_path in nx.all_simple_edge_paths(subgraph, edge1[0], edge2[1], 10):
-        if len(new_path) > 2:
-            break
-    if new_path is None or len(new_path) <= 2:
+    new_path = find_detour(graph, graph_nodes, edge1[0], edge2[1], 2, 10)
+    if new_path is None:
         return []
-    i = path.index(edge1)
-    path[i:i + 2] = new_path
+    path.replace([edge1, edge2], new_path)
     graph.remove_edges_from(new_path)
     # do I need to remove the last one too?
     graph_nodes.difference_update(start for start, end in new_path)
-    # debug.log(f"found new pair path of length {len(new_path)} at position {i}")
 
     return new_path
 
@@ -195,11 +298,3 @@ def post_process(points, shape, original_shape, fill):
                 stitches.extend(stitches)
 
     return stitches
-
-
-def path_to_points(path):
-    points = [start for start, end in path]
-    if path:
-        points.append(path[-1][1])
-
-    return points
@@ -71,209 +71,319 @@ def split_segment_stagger_phase(a, b, segment_length: float, num_staggers: int,
     return [line.interpolate(x, normalized=False) for x in splits]
 
 
-class AngleInterval():
-    # Modular interval containing either the entire circle or less than half of it
-    # partially based on https://fgiesen.wordpress.com/2015/09/24/intervals-in-modular-arithmetic/
-
-    def __init__(self, a: float, b: float, all: bool = False):
-        self.all = all
-        self.a = a
-        self.b = b
-
-    @staticmethod
-    def all():
-        return AngleInterval(0, math.tau, True)
-
-    @staticmethod
-    def fromBall(p: Point, epsilon: float):
-        d = p.length()
-        if d <= epsilon:
-            return AngleInterval.all()
-        center = p.angle()
-        delta = math.asin(epsilon / d)
-        return AngleInterval(center - delta, center + delta)
-
-    @staticmethod
-    def fromSegment(a: Point, b: Point):
-        angleA = a.angle()
-        angleB = b.angle()
-        diff = (angleB - angleA) % tau
-        if diff == 0 or diff == math.pi:
-            return None
-        elif diff < math.pi:
-            return AngleInterval(angleA - 1e-6, angleB + 1e-6)
-            # slightly larger than normal to avoid rounding error when this method is used in cutSegment
-        else:
-            return AngleInterval(angleB - 1e-6, angleA + 1e-6)
-
-    def containsAngle(self, angle: float):
-        if self.all:
-            return True
-        return (angle - self.a) % tau <= (self.b - self.a) % tau
-
-    def containsPoint(self, p: Point):
-        return self.containsAngle(math.atan2(p.y, p.x))
-
-    def intersect(self, other):
-        # assume that each interval contains less than half the circle (or all of it)
-        if other is None:
-            return None
-        elif self.all:
-            return other
-        elif other.all:
-            return self
-        elif self.containsAngle(other.a):
-            if other.containsAngle(self.b):
-                return AngleInterval(other.a, self.b)
-            else:
-                return AngleInterval(other.a, other.b)
-        elif other.containsAngle(self.a):
-            if self.containsAngle(other.b):
-                return AngleInterval(self.a, other.b)
-            else:
-                return AngleInterval(self.a, self.b)
-        else:
-            return None
-
-    def cutSegment(self, origin: Point, a: Point, b: Point):
-        if self.all:
-            return None
-        segArc = AngleInterval.fromSegment(a - origin, b - origin)
-        if segArc is None:
-            return a  # b is exactly behind origin from a
-        if segArc.containsAngle(self.a):
-            return cut_segment_with_angle(origin, self.a, a, b)
-        elif segArc.containsAngle(self.b):
-            return cut_segment_with_angle(origin, self.b, a, b)
-        else:
-            return None
+# The running stitch engine below works on coordinate arrays and plain
+# floats.  Strokes, travel stitches, meander, contour fill and smoothing all
+# end up here, often with tens of thousands of points, so we avoid creating
+# Point objects and angle interval objects for every point we look at.
+#
+# An angle interval (a "sleeve") is a tuple (all, a, b): either the entire
+# circle or the modular interval from angle a to angle b, which is less than
+# half of the circle.  The modular arithmetic is based on
+# https://fgiesen.wordpress.com/2015/09/24/intervals-in-modular-arithmetic/
+
+
+def _contains_angle(interval, angle):
+    all_angles, a, b = interval
+    if all_angles:
+        return True
+    return (angle - a) % tau <= (b - a) % tau
+
 
+def _angle_interval_from_segment(ax, ay, bx, by):
+    angle_a = math.atan2(ay, ax)
+    angle_b = math.atan2(by, bx)
+    diff = (angle_b - angle_a) % tau
+    if diff == 0 or diff == math.pi:
+        return None
+    elif diff < math.pi:
+        # slightly larger than normal to avoid rounding error when this is used in _cut_segment_with_sleeve()
+        return (False, angle_a - 1e-6, angle_b + 1e-6)
+    else:
+        return (False, angle_b - 1e-6, angle_a + 1e-6)
 
-def cut_segment_with_angle(origin: Point, angle: float, a: Point, b: Point) -> Point:
+
+def _cut_segment_with_angle(ox, oy, angle, ax, ay, bx, by):
     # Assumes the crossing is inside the segment
-    p = a - origin
-    d = b - a
-    c = Point(math.cos(angle), math.sin(angle))
-    t = (p.y*c.x - p.x*c.y) / (d.x*c.y - d.y*c.x)
+    px = ax - ox
+    py = ay - oy
+    dx = bx - ax
+    dy = by - ay
+    cx = math.cos(angle)
+    cy = math.sin(angle)
+    t = (py * cx - px * cy) / (dx * cy - dy * cx)
     if t < -0.000001 or t > 1.000001:
-        raise Exception("cut_segment_with_angle returned a parameter of {0} with points {1} {2} and cut line {3} ".format(t, p, b-origin, c))
-    return a + d*t
+        raise Exception("cut_segment_with_angle returned a parameter of {0} with points {1} {2} and cut line {3} ".format(
+            t, (px, py), (bx - ox, by - oy), (cx, cy)))
+    return ax + dx * t, ay + dy * t
 
 
-def cut_segment_with_circle(origin: Point, r: float, a: Point, b: Point) -> Point:
+def _cut_segment_with_circle(ox, oy, r, ax, ay, bx, by):
     # assumes that a is inside the circle and b is outside
-    p = a - origin
-    d = b - a
+    px = ax - ox
+    py = ay - oy
+    dx = bx - ax
+    dy = by - ay
     # inner products
-    p2 = p * p
-    d2 = d * d
+    p2 = px * px + py * py
+    d2 = dx * dx + dy * dy
     r2 = r * r
-    pd = p * d
+    pd = px * dx + py * dy
     # r2 = p2 + 2*pd*t + d2*t*t, quadratic formula
-    t = (math.sqrt(pd*pd + r2*d2 - p2*d2) - pd) / d2
+    t = (math.sqrt(pd * pd + r2 * d2 - p2 * d2) - pd) / d2
     if t < -0.000001 or t > 1.000001:
         raise Exception("cut_segment_with_circle returned a parameter of {0}".format(t))
-    return a + d*t
-
-
-def take_stitch(start: Point, points: typing.Sequence[Point], idx: int, stitch_length: float, tolerance: float):
-    # Based on a single step of the Zhao-Saalfeld curve simplification algorithm.
-    # https://cartogis.org/docs/proceedings/archive/auto-carto-13/pdf/linear-time-sleeve-fitting-polyline-simplification-algorithms.pdf
-    # Adds early termination condition based on stitch length.
-    if idx >= len(points):
-        return None, None
-
-    sleeve = AngleInterval.all()
-    last = start
-    for i in range(idx, len(points)):
-        p = points[i]
-        if sleeve.containsPoint(p - start):
-            if start.distance(p) < stitch_length:
-                sleeve = sleeve.intersect(AngleInterval.fromBall(p - start, tolerance))
-                last = p
+    return ax + dx * t, ay + dy * t
+
+
+def _cut_segment_with_sleeve(sleeve, ox, oy, ax, ay, bx, by):
+    """Find where the segment from a to b leaves the sleeve around origin.
+
+    Returns (x, y, True) if that's exactly a, (x, y, False) for a new point
+    or None if the segment doesn't cross the sleeve's edges.
+    """
+
+    if sleeve[0]:
+        return None
+    segment_arc = _angle_interval_from_segment(ax - ox, ay - oy, bx - ox, by - oy)
+    if segment_arc is None:
+        return ax, ay, True  # b is exactly behind origin from a
+    if _contains_angle(segment_arc, sleeve[1]):
+        return _cut_segment_with_angle(ox, oy, sleeve[1], ax, ay, bx, by) + (False,)
+    elif _contains_angle(segment_arc, sleeve[2]):
+        return _cut_segment_with_angle(ox, oy, sleeve[2], ax, ay, bx, by) + (False,)
+    else:
+        return None
+
+
+def _take_stitch(xs, ys, start_x, start_y, start_source, idx, end, stitch_length, tolerance):  # noqa: C901
+    """Find the next stitch, starting at the point with index idx.
+
+    Based on a single step of the Zhao-Saalfeld curve simplification algorithm.
+    https://cartogis.org/docs/proceedings/archive/auto-carto-13/pdf/linear-time-sleeve-fitting-polyline-simplification-algorithms.pdf
+    Adds early termination condition based on stitch length.
+
+    Returns (x, y, source, next idx).  source is the index of the point if
+    the stitch is exactly one of the points, otherwise -1.  next idx is None
+    once we've reached the end.
+    """
+
+    # This is the hot loop of the running stitch, so the sleeve is kept in
+    # local variables and the interval math is inlined.  Intersecting the
+    # sleeve with a ball keeps the endpoints that lie inside the other
+    # interval.
+    sleeve_all = True
+    sleeve_a = 0
+    sleeve_b = tau
+    sleeve_width = tau
+    last_x = start_x
+    last_y = start_y
+    last_source = start_source
+    for i in range(idx, end):
+        x = xs[i]
+        y = ys[i]
+        dx = x - start_x
+        dy = y - start_y
+
+        if sleeve_all or (sleeve_width is not None and
+                          (math.atan2(dy, dx) - sleeve_a) % tau <= sleeve_width):
+            distance = (dx ** 2 + dy ** 2) ** 0.5
+            if distance < stitch_length:
+                if distance > tolerance:
+                    # narrow the sleeve down to the ball of radius tolerance around this point
+                    angle = math.atan2(dy, dx)
+                    delta = math.asin(tolerance / distance)
+                    ball_a = angle - delta
+                    ball_b = angle + delta
+                    ball_width = (ball_b - ball_a) % tau
+                    if sleeve_all:
+                        sleeve_all = False
+                        sleeve_a = ball_a
+                        sleeve_b = ball_b
+                    elif (ball_a - sleeve_a) % tau <= sleeve_width:
+                        if (sleeve_b - ball_a) % tau > ball_width:
+                            sleeve_b = ball_b
+                        sleeve_a = ball_a
+                    elif (sleeve_a - ball_a) % tau <= ball_width:
+                        if (ball_b - sleeve_a) % tau <= sleeve_width:
+                            sleeve_b = ball_b
+                    else:
+                        # the sleeve has collapsed
+                        sleeve_a = None
+                    sleeve_width = None if sleeve_a is None else (sleeve_b - sleeve_a) % tau
+                last_x = x
+                last_y = y
+                last_source = i
                 continue
             else:
-                cut = cut_segment_with_circle(start, stitch_length, last, p)
-                return cut, i
+                return _cut_segment_with_circle(start_x, start_y, stitch_length, last_x, last_y, x, y) + (-1, i)
         else:
-            cut = sleeve.cutSegment(start, last, p)
-            if start.distance(cut) > stitch_length:
-                cut = cut_segment_with_circle(start, stitch_length, last, p)
-            return cut, i
-    return points[-1], None
+            cut = None
+            if sleeve_width is not None:
+                cut = _cut_segment_with_sleeve((sleeve_all, sleeve_a, sleeve_b), start_x, start_y, last_x, last_y, x, y)
+            if cut is None:
+                # The sleeve has collapsed.  This can only happen due to
+                # rounding errors, so just stop at the last point that fit.
+                return last_x, last_y, last_source, i
 
+            cut_x, cut_y, is_last = cut
+            if ((cut_x - start_x) ** 2 + (cut_y - start_y) ** 2) ** 0.5 > stitch_length:
+                return _cut_segment_with_circle(start_x, start_y, stitch_length, last_x, last_y, x, y) + (-1, i)
+            return cut_x, cut_y, last_source if is_last else -1, i
+    return xs[end - 1], ys[end - 1], end - 1, None
 
-def stitch_curve_evenly(points: typing.Sequence[Point], stitch_length: float, tolerance: float):
+
+def _segment_lengths(xs, ys):
+    # The same arithmetic as Point.distance().  NumPy computes ** 0.5 as a
+    # square root, which can round differently than Python's pow() does.
+    return [((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+            for x1, y1, x2, y2 in zip(xs, ys, xs[1:], ys[1:])]
+
+
+def _stitch_curve_evenly(xs, ys, lengths, start, end, stitch_length, tolerance):
     # Will split a straight line into even-length stitches while still handling curves correctly.
     # Includes end point but not start point.
-    if len(points) < 2:
-        return []
-    distLeft = [0] * len(points)
-    for i in reversed(range(0, len(points) - 1)):
-        distLeft[i] = distLeft[i + 1] + points[i].distance(points[i+1])
-
-    i = 1
-    last = points[0]
     stitches = []
-    while i is not None and i < len(points):
+    if end - start < 2:
+        return stitches
+
+    # distance left to the end of the curve from each point
+    dist_left = [0] * (end - start)
+    for i in reversed(range(end - start - 1)):
+        dist_left[i] = dist_left[i + 1] + lengths[start + i]
+
+    i = start + 1
+    last_x = xs[start]
+    last_y = ys[start]
+    last_source = start
+    while i is not None and i < end:
         check_stop_flag()
 
-        d = last.distance(points[i]) + distLeft[i]
+        d = ((xs[i] - last_x) ** 2 + (ys[i] - last_y) ** 2) ** 0.5 + dist_left[i - start]
         if d == 0:
             return stitches
         stitch_len = d / math.ceil(d / stitch_length) + 0.000001  # correction for rounding error
 
-        stitch, newidx = take_stitch(last, points, i, stitch_len, tolerance)
-        i = newidx
-        if stitch is not None:
-            stitches.append(stitch)
-            last = stitch
+        last_x, last_y, last_source, i = _take_stitch(xs, ys, last_x, last_y, last_source, i, end, stitch_len, tolerance)
+        stitches.append((last_x, last_y, last_source))
     return stitches
 
 
-def path_to_curves(points: typing.List[Point], min_len: float):
-    # split a path at obvious corner points so that they get stitched exactly
-    # min_len controls the minimum length after splitting for which it won't split again,
-    # which is used to avoid creating large numbers of corner points when encouintering micro-messes.
-    if len(points) < 3:
-        return [points]
-    curves = []
+def _path_to_curves(coordinates, lengths, min_len):
+    """Split a path at obvious corner points so that they get stitched exactly.
+
+    min_len controls the minimum length after splitting for which it won't split again,
+    which is used to avoid creating large numbers of corner points when encountering micro-messes.
+
+    Returns a list of (start, end) index ranges.  Neighboring curves share
+    their corner point.
+    """
+
+    if len(coordinates) < 3:
+        return [(0, len(coordinates))]
+
+    segments = np.diff(coordinates, axis=0)
+    segments_squared = segments[:, 0] ** 2 + segments[:, 1] ** 2
+
+    # The vector of the last segment before each segment, skipping segments
+    # without length (but not the very first one).
+    has_length = segments_squared > 0
+    has_length[0] = True
+    previous = np.maximum.accumulate(np.where(has_length, np.arange(len(segments)), 0))[:-1]
 
+    # Test if the turn angle from vectors a to b is more than 45 degrees.
+    # Optimized version of checking if cos(angle(a,b)) <= sqrt(0.5) and is defined
+    a = segments[previous]
+    b = segments[1:]
+    aabb = segments_squared[previous] * segments_squared[1:]
+    ab = a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1]
+    abab = ab * np.abs(ab)
+    corners = (np.flatnonzero((aabb > 0) & (abab <= 0.5 * aabb)) + 1).tolist()
+
+    curves = []
     last = 0
-    last_seg = points[1] - points[0]
-    seg_len = last_seg.length()
-    for i in range(1, len(points) - 1):
-        # vectors of the last and next segments
-        a = last_seg
-        b = points[i + 1] - points[i]
-        aabb = (a * a) * (b * b)
-        abab = (a * b) * abs(a * b)
-
-        # Test if the turn angle from vectors a to b is more than 45 degrees.
-        # Optimized version of checking if cos(angle(a,b)) <= sqrt(0.5) and is defined
-        if aabb > 0 and abab <= 0.5 * aabb:
-            if seg_len >= min_len:
-                curves.append(points[last: i + 1])
-                last = i
-            seg_len = 0
-
-        if b * b > 0:
-            last_seg = b
-        seg_len += b.length()
-
-    curves.append(points[last:])
+    since_corner = 0
+    for corner in corners:
+        # the length of the path since the last corner (whether we split there or not)
+        if sum(lengths[since_corner:corner]) >= min_len:
+            curves.append((last, corner + 1))
+            last = corner
+        since_corner = corner
+
+    curves.append((last, len(coordinates)))
     return curves
 
 
+def _running_stitch(coordinates, stitch_length, tolerance):
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    xs, ys = coordinates.T.tolist()
+    lengths = _segment_lengths(xs, ys)
+
+    stitches = [(xs[0], ys[0], 0)]
+    for start, end in _path_to_curves(coordinates, lengths, 2 * tolerance):
+        # segments longer than twice the tollerance will usually be forced by it, so set that as the minimum for corner detection
+        stitches.extend(_stitch_curve_evenly(xs, ys, lengths, start, end, stitch_length, tolerance))
+
+    stitches = np.array(stitches, dtype=float).reshape(-1, 3)
+    return stitches[:, :2], stitches[:, 2].astype(int)
+
+
+def running_stitch_array(coordinates, stitch_length, tolerance):
+    """Turn a continuous path into a running stitch.
+
+    Arguments:
+        coordinates -- an (N, 2) array of the points of the path
+
+    Returns: an (M, 2) array of stitch coordinates
+    """
+
+    if len(coordinates) == 0:
+        return np.empty((0, 2))
+
+    return _running_stitch(coordinates, stitch_length, tolerance)[0]
+
+
+def _points_to_array(points):
+    return np.array([(point.x, point.y) for point in points], dtype=float).reshape(-1, 2)
+
+
+def _array_to_points(points, coordinates, sources):
+    # Stitches that are exactly one of the original points are that point, so
+    # that e.g. the tags of Stitch objects are kept.
+    point_class = type(points[0])
+    return [points[source] if source >= 0 else point_class(x, y)
+            for (x, y), source in zip(coordinates.tolist(), sources.tolist())]
+
+
+def stitch_curve_evenly(points: typing.Sequence[Point], stitch_length: float, tolerance: float):
+    # Will split a straight line into even-length stitches while still handling curves correctly.
+    # Includes end point but not start point.
+    if len(points) < 2:
+        return []
+
+    coordinates = _points_to_array(points)
+    xs, ys = coordinates.T.tolist()
+    lengths = _segment_lengths(xs, ys)
+
+    stitches = np.array(_stitch_curve_evenly(xs, ys, lengths, 0, len(points), stitch_length, tolerance)).reshape(-1, 3)
+    return _array_to_points(points, stitches[:, :2], stitches[:, 2].astype(int))
+
+
+def path_to_curves(points: typing.List[Point], min_len: float):
+    # split a path at obvious corner points so that they get stitched exactly
+    coordinates = _points_to_array(points)
+    xs, ys = coordinates.T.tolist()
+    lengths = _segment_lengths(xs, ys)
+
+    return [points[start:end] for start, end in _path_to_curves(coordinates, lengths, min_len)]
+
+
 def running_stitch(points, stitch_length, tolerance):
     # Turn a continuous path into a running stitch.
     if not points:
         return
-    stitches = [points[0]]
-    for curve in path_to_curves(points, 2 * tolerance):
-        # segments longer than twice the tollerance will usually be forced by it, so set that as the minimum for corner detection
-        stitches.extend(stitch_curve_evenly(curve, stitch_length, tolerance))
-    return stitches
+
+    coordinates, sources = _running_stitch(_points_to_array(points), stitch_length, tolerance)
+    return _array_to_points(points, coordinates, sources)
 
 
 def bean_stitch(stitches, repeats, tags_to_ignore=None):
@@ -3,13 +3,13 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
-import math
-from math import pi
+import re
 
 import inkex
+import numpy as np
 
 from ..i18n import _
-from ..utils import Point, cache
+from ..utils import cache
 from .tags import INKSCAPE_GROUPMODE, INKSCAPE_LABEL, INKSTITCH_ATTRIBS
 from .units import PIXELS_PER_MM, get_viewbox_transform
 
@@ -111,50 +111,136 @@ realistic_filter = """
 """
 
 
-def realistic_stitch(start, end):
-    """Generate a stitch vector path given a start and end point."""
+# The corners of stitch_path, as absolute coordinates in the same order.
+# Each one is an offset plus a multiple of the stitch length:
+# (x offset, x multiple of the length, y).
+stitch_path_points = np.array([
+    # M
+    (0, 0, 0),
+    # C
+    (0.4, 0, 0), (0.4, 0, 0.3), (0.4, 0, 0.6),
+    # C
+    (0.4, 0, 0.9), (0.3, 0, 1.2), (0, 0, 1.2),
+    # L L L
+    (0, 0, 1.4), (0, 0, 1.2), (0, -1, 1.2),
+    # C
+    (-0.4, -1, 1.2), (-0.4, -1, 0.9), (-0.4, -1, 0.6),
+    # C
+    (-0.4, -1, 0.3), (-0.3, -1, 0), (0, -1, 0),
+    # L L
+    (0, -1, -0.2), (0, -1, 0),
+])
+stitch_path_template = "M %.3f,%.3f C %.3f,%.3f %.3f,%.3f %.3f,%.3f C %.3f,%.3f %.3f,%.3f %.3f,%.3f " \
+                       "L %.3f,%.3f L %.3f,%.3f L %.3f,%.3f C %.3f,%.3f %.3f,%.3f %.3f,%.3f " \
+                       "C %.3f,%.3f %.3f,%.3f %.3f,%.3f L %.3f,%.3f L %.3f,%.3f Z"
+
+# How many paths to render each color block's realistic stitches into.  The
+# stitches are dealt out to the paths in turn, so that consecutive stitches
+# (which touch each other) are lit separately.
+realistic_paths_per_block = 2
+
+# Stitch paths are written with this many decimal places, which is far finer
+# than any embroidery machine can stitch.
+path_precision = 3
+trailing_zeros = re.compile(r"(\.[0-9]*[1-9])0+\b|\.0+\b")
+
+
+def realistic_stitches(starts, ends):
+    """Generate stitch vector paths given arrays of start and end points.
+
+    Returns an array of shape (N, 36): the absolute coordinates of
+    stitch_path for each stitch, in the order stitch_path_template expects.
+    """
+
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+
+    directions = ends - starts
+    stitch_lengths = np.hypot(directions[:, 0], directions[:, 1])
+    stitch_centers = (starts + ends) / 2.0
+    stitch_angles = np.arctan2(directions[:, 1], directions[:, 0])
+
+    stitch_lengths = np.maximum(0, stitch_lengths - 0.2 * PIXELS_PER_MM)
+
+    # the shape of each stitch before rotating it, relative to its center
+    xs = stitch_path_points[:, 0] + np.outer(stitch_lengths, stitch_path_points[:, 1]) + stitch_lengths[:, np.newaxis] / 2.0
+    ys = np.broadcast_to(stitch_path_points[:, 2] - stitch_height / 2.0, xs.shape)
+
+    # rotate the shape to match the stitch and move it to the location of the stitch
+    cos = np.cos(stitch_angles)[:, np.newaxis]
+    sin = np.sin(stitch_angles)[:, np.newaxis]
+    points = np.empty((len(starts), len(stitch_path_points), 2))
+    points[:, :, 0] = xs * cos - ys * sin + stitch_centers[:, 0:1]
+    points[:, :, 1] = xs * sin + ys * cos + stitch_centers[:, 1:2]
+
+    return points.reshape(len(starts), -1)
 
-    end = Point(*end)
-    start = Point(*start)
 
-    stitch_length = (end - start).length()
-    stitch_center = Point((end.x+start.x)/2.0, (end[1]+start[1])/2.0)
-    stitch_direction = (end - start)
-    stitch_angle = math.atan2(stitch_direction.y, stitch_direction.x) * (180 / pi)
+def color_block_to_point_lists(color_block):
+    """Split a color block's stitches into point lists at each trim.
 
-    stitch_length = max(0, stitch_length - 0.2 * PIXELS_PER_MM)
+    Returns a list of (N, 2) NumPy arrays of stitch coordinates, leaving
+    out jumps, stops and color changes and any list with fewer than two
+    points.
+    """
 
-    # create the path by filling in the length in the template
-    path = inkex.Path(stitch_path % stitch_length).to_arrays()
+    # If we try to import these above, we get into a mess of circular
+    # imports.
+    from ..stitch_plan.color_block import COLOR_CHANGE, JUMP, STOP, TRIM
+
+    commands = color_block.commands
+    skipped = (commands & (JUMP | STOP | COLOR_CHANGE)) != 0
+    trims = (commands & TRIM) != 0
+    keep = ~skipped & ~trims
+
+    # A trim starts a new point list unless the current one is still empty,
+    # in which case the trim stitch itself is kept like any other stitch.
+    # That depends on what came before, but there are only a few trims.
+    kept_before = np.concatenate(([0], np.cumsum(keep)))
+    breaks = []
+    start = 0
+    kept_trim = False
+    for index in np.flatnonzero(trims).tolist():
+        if kept_trim or kept_before[index] > kept_before[start]:
+            breaks.append(index)
+            start = index + 1
+            kept_trim = False
+        elif not skipped[index]:
+            keep[index] = True
+            kept_trim = True
+
+    indices = np.flatnonzero(keep)
+    split_at = np.searchsorted(indices, breaks)
+    point_lists = np.split(color_block.coordinates[indices], split_at)
 
-    # rotate the path to match the stitch
-    rotation_center_x = -stitch_length / 2.0
-    rotation_center_y = stitch_height / 2.0
+    # filter out empty point lists
+    point_lists = [p for p in point_lists if len(p) > 1]
 
-    path = inkex.Path(path).rotate(stitch_angle, (rotation_center_x, rotation_center_y))
+    return point_lists
 
-    # move the path to the location of the stitch
-    path = inkex.Path(path).translate(stitch_center.x - rotation_center_x, stitch_center.y - rotation_center_y)
 
-    return str(path)
+def point_list_to_path(point_list, relative=False):
+    """Format a point list as SVG path data in one go.
 
+    Coordinates are rounded to 0.001px and trailing zeros are dropped.  With
+    relative=True each point is given as an offset from the one before it,
+    which makes the path data quite a bit shorter.  The offsets are taken
+    between the rounded coordinates, so rounding errors don't add up.
+    """
 
-def color_block_to_point_lists(color_block):
-    point_lists = [[]]
+    points = np.round(np.asarray(point_list, dtype=float), path_precision)
+    if relative:
+        points[1:] = np.round(np.diff(points, axis=0), path_precision)
+        command = "m"
+    else:
+        command = "M"
 
-    for stitch in color_block:
-        if stitch.trim:
-            if point_lists[-1]:
-                point_lists.append([])
-                continue
+    # -0 is valid but a waste of space
+    points += 0.0
+    template = "%%.%df,%%.%df" % (path_precision, path_precision)
+    data = " ".join([template] * len(points)) % tuple(points.ravel().tolist())
 
-        if not stitch.jump and not stitch.color_change and not stitch.stop:
-            point_lists[-1].append(stitch.as_tuple())
-
-    # filter out empty point lists
-    point_lists = [p for p in point_lists if len(p) > 1]
-
-    return point_lists
+    return command + trailing_zeros.sub(r"\1", data)
 
 
 @cache
@@ -168,19 +254,28 @@ def get_correction_transform(svg):
 
 
 def color_block_to_realistic_stitches(color_block, svg, destination):
-    for point_list in color_block_to_point_lists(color_block):
-        color = color_block.color.visible_on_white.darker.to_hex_str()
-        start = point_list[0]
-        for point in point_list[1:]:
-            destination.append(inkex.PathElement(attrib={
-                'style': "fill: %s; stroke: none; filter: url(#realistic-stitch-filter);" % color,
-                'd': realistic_stitch(start, point),
-                'transform': get_correction_transform(svg)
-            }))
-            start = point
-
-
-def color_block_to_paths(color_block, svg, destination, visual_commands):
+    point_lists = color_block_to_point_lists(color_block)
+    if not point_lists:
+        return
+
+    starts = np.concatenate([point_list[:-1] for point_list in point_lists])
+    ends = np.concatenate([point_list[1:] for point_list in point_lists])
+
+    stitches = realistic_stitches(starts, ends).tolist()
+    color = color_block.color.visible_on_white.darker.to_hex_str()
+
+    # All of the stitches share the realistic filter, and every path holds
+    # many stitches, so the number of elements doesn't grow with the number
+    # of stitches.
+    for i in range(min(realistic_paths_per_block, len(stitches))):
+        destination.append(inkex.PathElement(attrib={
+            'style': "fill: %s; stroke: none; filter: url(#realistic-stitch-filter);" % color,
+            'd': " ".join(stitch_path_template % tuple(stitch) for stitch in stitches[i::realistic_paths_per_block]),
+            'transform': get_correction_transform(svg)
+        }))
+
+
+def color_block_to_paths(color_block, svg, destination, visual_commands, relative=False):
     # If we try to import these above, we get into a mess of circular
     # imports.
     from ..commands import add_commands
@@ -202,7 +297,7 @@ def color_block_to_paths(color_block, svg, destination, visual_commands):
         path = inkex.PathElement(attrib={
             'id': svg.get_unique_id("object"),
             'style': "stroke: %s; stroke-width: 0.4; fill: none;" % color,
-            'd': "M" + " ".join(" ".join(str(coord) for coord in point) for point in point_list),
+            'd': point_list_to_path(point_list, relative),
             'transform': get_correction_transform(svg),
             INKSTITCH_ATTRIBS['stroke_method']: 'manual_stitch'
         })
@@ -221,7 +316,7 @@ def color_block_to_paths(color_block, svg, destination, visual_commands):
             path.set(INKSTITCH_ATTRIBS['stop_after'], 'true')
 
 
-def render_stitch_plan(svg, stitch_plan, realistic=False, visual_commands=True):
+def render_stitch_plan(svg, stitch_plan, realistic=False, visual_commands=True, relative=False):
     layer = svg.find(".//*[@id='__inkstitch_stitch_plan__']")
     if layer is None:
         layer = inkex.Group(attrib={
@@ -247,7 +342,7 @@ def render_stitch_plan(svg, stitch_plan, realistic=False, visual_commands=True):
         if realistic:
             color_block_to_realistic_stitches(color_block, svg, group)
         else:
-            color_block_to_paths(color_block, svg, group, visual_commands)
+            color_block_to_paths(color_block, svg, group, visual_commands, relative)
 
     if realistic:
         filter_document = inkex.load_svg(realistic_filter)
@@ -7,6 +7,7 @@ from inkex import NSS
 from lxml import etree
 
 from ..utils import cache
+from .tags import SVG_STYLE_TAG, SVG_SVG_TAG
 
 
 @cache
@@ -36,3 +37,71 @@ def find_elements(node, xpath):
     document = get_document(node)
     elements = document.xpath(xpath, namespaces=NSS)
     return elements
+
+
+# The only attributes of the root <svg> element that change how its
+# descendants are stitched.  Everything else (sodipodi:docname, inkscape:version
+# and so on) can change without invalidating the cache.
+ROOT_CACHE_KEY_ATTRIBUTES = ('width', 'height', 'viewBox', 'preserveAspectRatio', 'style', 'class')
+
+
+def get_node_cache_key_data(node):
+    """Get the raw SVG data that determines how a node is stitched.
+
+    That's the node's own attributes (path data, transform, style and params),
+    the attributes of all of its ancestors (their transforms and styles cascade
+    down to the node) and the document's style sheets.  Hashing these is a lot
+    cheaper than hashing the transformed path and the computed style.
+
+    Returns: bytes
+    """
+
+    data = [get_attributes_cache_key_data(node)]
+    for ancestor in node.iterancestors():
+        if ancestor.tag == SVG_SVG_TAG and ancestor.getparent() is None:
+            data.append(get_attributes_cache_key_data(ancestor, ROOT_CACHE_KEY_ATTRIBUTES))
+        else:
+            data.append(get_attributes_cache_key_data(ancestor))
+    data.append(_get_style_sheets_cache_key_data(get_document(node)))
+
+    return b"\0".join(data)
+
+
+def get_attributes_cache_key_data(node, names=None):
+    """Get a node's tag and attributes as bytes.
+
+    inkex rewrites the transform, style and class attributes in canonical form
+    (or removes them if they're empty) as soon as they're read, so we use that
+    form here.  Otherwise a node's key would change once anything looked at it
+    or at one of its ancestors.
+
+    Arguments:
+        names -- if given, only include these attributes
+    """
+
+    wrapped_attributes = getattr(node, 'wrapped_attrs', {})
+
+    data = [str(node.tag)]
+    for name, value in sorted(node.attrib.items()):
+        if names is not None and name not in names:
+            continue
+
+        if name in wrapped_attributes:
+            wrapper = wrapped_attributes[name][1](value)
+            if not wrapper:
+                continue
+            value = str(wrapper)
+
+        data.append(f"{name}={value}")
+
+    return "\x1f".join(data).encode()
+
+
+def _get_style_sheets_cache_key_data(document):
+    # inkex keeps track of the document's <style> elements, which saves us from
+    # searching the whole document for them every time.
+    style_sheets = getattr(document, 'stylesheet_cache', None)
+    if style_sheets is None:
+        style_sheets = document.iter(SVG_STYLE_TAG)
+
+    return "\x1f".join(style_sheet.text or "" for style_sheet in style_sheets).encode()
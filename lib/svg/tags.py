@@ -9,6 +9,7 @@ from lxml import etree
 etree.register_namespace("inkstitch", "http://inkstitch.org/namespace")
 inkex.NSS['inkstitch'] = 'http://inkstitch.org/namespace'
 
+SVG_SVG_TAG = inkex.addNS('svg', 'svg')
 SVG_PATH_TAG = inkex.addNS('path', 'svg')
 SVG_LINE_TAG = inkex.addNS('line', 'svg')
 SVG_POLYLINE_TAG = inkex.addNS('polyline', 'svg')
@@ -26,6 +27,7 @@ SVG_USE_TAG = inkex.addNS('use', 'svg')
 SVG_IMAGE_TAG = inkex.addNS('image', 'svg')
 SVG_CLIPPATH_TAG = inkex.addNS('clipPath', 'svg')
 SVG_MASK_TAG = inkex.addNS('mask', 'svg')
+SVG_STYLE_TAG = inkex.addNS('style', 'svg')
 
 SVG_METADATA_TAG = inkex.addNS("metadata", "svg")
 INKSCAPE_LABEL = inkex.addNS('label', 'inkscape')
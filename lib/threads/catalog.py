@@ -9,15 +9,30 @@ from collections.abc import Sequence
 from glob import glob
 from os.path import dirname, realpath
 
+import numpy
+
 from ..utils import guess_inkscape_config_path
+from ..utils.cache import get_thread_palette_cache
 from .palette import ThreadPalette
 
+# Change this whenever ThreadPalette.compile() changes.
+PALETTE_INDEX_VERSION = 1
+
 
 class _ThreadCatalog(Sequence):
-    """Holds a set of ThreadPalettes."""
+    """Holds a set of ThreadPalettes.
+
+    Reading a palette file means converting every one of its colors to Lab,
+    which adds up with dozens of palettes.  The catalog keeps the compiled
+    palettes in the thread palette cache and only reads a palette file again
+    if it changed.  ThreadPalette objects are only created when a palette is
+    actually asked for.
+    """
 
     def __init__(self):
-        self.palettes = []
+        self._compiled_palettes = []
+        self._palettes = []
+        self._palettes_by_color = None
         self.load_palettes(self.get_palettes_paths())
 
     def get_palettes_paths(self):
@@ -37,30 +52,83 @@ class _ThreadCatalog(Sequence):
         return path
 
     def load_palettes(self, paths):
+        palette_cache = get_thread_palette_cache()
+
         palettes = []
         for path in paths:
+            cache_key = ("thread palettes", PALETTE_INDEX_VERSION, os.path.abspath(path))
+            entries = palette_cache.get(cache_key, {})
+            new_entries = {}
+            changed = False
+
             for palette_file in glob(os.path.join(path, 'InkStitch*.gpl')):
                 palette_basename = os.path.basename(palette_file)
-                if palette_basename not in palettes:
-                    palette = ThreadPalette(palette_file)
-                    if not palette.is_gimp_palette:
-                        continue
-                    self.palettes.append(ThreadPalette(palette_file))
-                    palettes.append(palette_basename)
+                if palette_basename in palettes:
+                    continue
+
+                stamp = self._get_stamp(palette_file)
+                entry = entries.get(palette_basename)
+                if entry is None or entry['stamp'] != stamp:
+                    entry = dict(stamp=stamp, palette=ThreadPalette(palette_file).compile())
+                    changed = True
+                new_entries[palette_basename] = entry
+
+                if not entry['palette']['is_gimp_palette']:
+                    continue
+                self._compiled_palettes.append(entry['palette'])
+                self._palettes.append(None)
+                palettes.append(palette_basename)
+
+            if changed or new_entries.keys() != entries.keys():
+                palette_cache[cache_key] = new_entries
+
+    def _get_stamp(self, palette_file):
+        try:
+            stat = os.stat(palette_file)
+        except OSError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
 
     def palette_names(self):
-        return list(sorted(palette.name for palette in self))
+        return list(sorted(compiled['name'] for compiled in self._compiled_palettes))
 
     def __getitem__(self, item):
-        return self.palettes[item]
+        palette = self._palettes[item]
+        if palette is None:
+            palette = ThreadPalette.from_compiled(self._compiled_palettes[item])
+            self._palettes[item] = palette
+
+        return palette
 
     def __len__(self):
-        return len(self.palettes)
+        return len(self._compiled_palettes)
+
+    def _get_palettes_by_color(self):
+        """Map each RGB value to the indexes of the palettes that have a thread with that color."""
+
+        if self._palettes_by_color is None:
+            palettes_by_color = {}
+            for i, compiled in enumerate(self._compiled_palettes):
+                for rgb in compiled['rgb'].tolist():
+                    palettes_by_color.setdefault(tuple(rgb), []).append(i)
+
+            self._palettes_by_color = {rgb: numpy.array(indexes) for rgb, indexes in palettes_by_color.items()}
+
+        return self._palettes_by_color
+
+    def _num_exact_color_matches(self, threads):
+        """Number of colors in stitch plan with an exact match in each palette."""
+
+        palettes_by_color = self._get_palettes_by_color()
 
-    def _num_exact_color_matches(self, palette, threads):
-        """Number of colors in stitch plan with an exact match in this palette."""
+        matches = numpy.zeros(len(self), dtype=int)
+        for thread in threads:
+            indexes = palettes_by_color.get(tuple(thread.rgb))
+            if indexes is not None:
+                matches[indexes] += 1
 
-        return sum(1 for thread in threads if thread in palette)
+        return matches
 
     def match_and_apply_palette(self, stitch_plan, palette=None):
         if palette is None:
@@ -81,13 +149,13 @@ class _ThreadCatalog(Sequence):
         chosen if more than 80% of the thread colors in the stitch plan are
         exact matches for threads in the palette.
         """
-        if not self.palettes:
+        if not self._compiled_palettes:
             return None
 
         threads = [color_block.color for color_block in stitch_plan]
-        palettes_and_matches = [(palette, self._num_exact_color_matches(palette, threads))
-                                for palette in self]
-        palette, matches = max(palettes_and_matches, key=lambda item: item[1])
+        matches = self._num_exact_color_matches(threads)
+        best = int(matches.argmax())
+        palette, matches = self[best], matches[best]
 
         if matches < 0.8 * len(stitch_plan):
             # if less than 80% of the colors are an exact match,
@@ -97,17 +165,18 @@ class _ThreadCatalog(Sequence):
             return palette
 
     def apply_palette(self, stitch_plan, palette):
-        for color_block in stitch_plan:
-            nearest = palette.nearest_color(color_block.color)
+        color_blocks = list(stitch_plan)
+        nearest_colors = palette.nearest_colors([color_block.color for color_block in color_blocks])
 
+        for color_block, nearest in zip(color_blocks, nearest_colors):
             color_block.color.name = nearest.name
             color_block.color.number = nearest.number
             color_block.color.manufacturer = nearest.manufacturer
 
     def get_palette_by_name(self, name):
-        for palette in self:
-            if palette.name == name:
-                return palette
+        for i, compiled in enumerate(self._compiled_palettes):
+            if compiled['name'] == name:
+                return self[i]
 
 
 _catalog = None
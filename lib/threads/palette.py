@@ -5,6 +5,7 @@
 
 from collections.abc import Set
 
+import numpy
 from colormath.color_conversions import convert_color
 from colormath.color_diff import delta_e_cie1994
 from colormath.color_objects import LabColor, sRGBColor
@@ -17,12 +18,84 @@ def compare_thread_colors(color1, color2):
     return delta_e_cie1994(color1, color2, K_L=2)
 
 
+def compare_thread_colors_matrix(lab1, lab2, K_L=2, K_C=1, K_H=1, K_1=0.045, K_2=0.015):
+    """Compare many thread colors at once.
+
+    This is the same CIE1994 delta E as compare_thread_colors(), using the
+    same arithmetic as colormath so that the results are exactly the same.
+
+    Arguments:
+      lab1 -- an N x 3 array of the reference colors (the palette's threads)
+      lab2 -- an M x 3 array of the colors to compare them to
+
+    Returns:
+      an M x N array of delta E values
+    """
+
+    L_1, a_1, b_1 = lab1.T
+    L_2, a_2, b_2 = (column[:, numpy.newaxis] for column in lab2.T)
+
+    C_1 = numpy.sqrt(a_1 * a_1 + b_1 * b_1)
+    C_2 = numpy.sqrt(a_2 * a_2 + b_2 * b_2)
+
+    delta_L = L_1 - L_2
+    delta_C = C_1 - C_2
+    delta_a = a_1 - a_2
+    delta_b = b_1 - b_2
+    delta_H = numpy.sqrt((delta_a * delta_a - delta_C * delta_C + delta_b * delta_b).clip(min=0))
+
+    L = delta_L / K_L
+    C = delta_C / (K_C * (1 + K_1 * C_1))
+    H = delta_H / (K_H * (1 + K_2 * C_1))
+
+    return numpy.sqrt(L * L + C * C + H * H)
+
+
+def color_to_lab(color):
+    if isinstance(color, ThreadColor):
+        color = color.rgb
+
+    lab = convert_color(sRGBColor(*color, is_upscaled=True), LabColor)
+    return (lab.lab_l, lab.lab_a, lab.lab_b)
+
+
 class ThreadPalette(Set):
     """Holds a set of ThreadColors all from the same manufacturer."""
 
     def __init__(self, palette_file):
         self.threads = dict()
         self.parse_palette_file(palette_file)
+        self._index_threads()
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        """Make a ThreadPalette from the output of compile() without reading the palette file."""
+
+        palette = cls.__new__(cls)
+        palette.is_gimp_palette = compiled['is_gimp_palette']
+        palette.threads = dict()
+
+        if palette.is_gimp_palette:
+            palette.name = compiled['name']
+            for rgb, name, number, lab in zip(compiled['rgb'].tolist(), compiled['names'], compiled['numbers'], compiled['lab'].tolist()):
+                thread = ThreadColor(rgb, name, number, manufacturer=palette.name)
+                palette.threads[thread] = LabColor(*lab, illuminant='d65')
+
+        palette._index_threads()
+        return palette
+
+    def compile(self):
+        """Return everything there is to know about this palette as plain data and arrays."""
+
+        if not self.is_gimp_palette:
+            return dict(is_gimp_palette=False)
+
+        return dict(is_gimp_palette=True,
+                    name=self.name,
+                    rgb=numpy.array([thread.rgb for thread in self.thread_list], dtype=numpy.int32).reshape(-1, 3),
+                    names=[thread.name for thread in self.thread_list],
+                    numbers=[thread.number for thread in self.thread_list],
+                    lab=self.lab)
 
     def parse_palette_file(self, palette_file):
         """Read a GIMP palette file and load thread colors.
@@ -68,6 +141,12 @@ class ThreadPalette(Set):
                 except (ValueError, IndexError):
                     continue
 
+    def _index_threads(self):
+        # The threads in the same order as their Lab values in self.lab.
+        self.thread_list = list(self.threads)
+        self.lab = numpy.array([(lab.lab_l, lab.lab_a, lab.lab_b) for lab in self.threads.values()],
+                               dtype=numpy.float64).reshape(-1, 3)
+
     def __contains__(self, thread):
         return thread in self.threads
 
@@ -80,9 +159,19 @@ class ThreadPalette(Set):
     def nearest_color(self, color):
         """Find the thread in this palette that looks the most like the specified color."""
 
-        if isinstance(color, ThreadColor):
-            color = color.rgb
+        return self.nearest_colors([color])[0]
+
+    def nearest_colors(self, colors):
+        """Find the nearest thread in this palette for each of the specified colors.
+
+        This compares all of the colors to all of the threads in one go,
+        which is a lot faster than calling nearest_color() for each color.
+        """
+
+        if not colors:
+            return []
 
-        color = convert_color(sRGBColor(*color, is_upscaled=True), LabColor)
+        lab = numpy.array([color_to_lab(color) for color in colors], dtype=numpy.float64)
+        nearest = compare_thread_colors_matrix(self.lab, lab).argmin(axis=1)
 
-        return min(self, key=lambda thread: compare_thread_colors(self.threads[thread], color))
+        return [self.thread_list[i] for i in nearest]
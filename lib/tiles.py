@@ -1,10 +1,15 @@
+import hashlib
 import os
+import pickle
+from collections import OrderedDict, deque
 from math import ceil
 
 import inkex
 import json
 import lxml
 import networkx as nx
+import numpy as np
+from shapely import vectorized
 from shapely.geometry import LineString, MultiLineString
 from shapely.prepared import prep
 
@@ -14,6 +19,9 @@ from .svg import apply_transforms
 from .utils import Point, cache, get_bundled_dir, guess_inkscape_config_path
 from .utils.threading import check_stop_flag
 
+# how many graphs each tile remembers, see Tile.to_graph()
+GRAPH_CACHE_SIZE = 4
+
 
 class Tile:
     def __init__(self, path):
@@ -28,6 +36,7 @@ class Tile:
         self.height = None
         self.shift0 = None
         self.shift1 = None
+        self._graphs = OrderedDict()
 
     def __lt__(self, other):
         return self.name < other.name
@@ -53,6 +62,10 @@ class Tile:
         return os.path.splitext(os.path.basename(tile_path))[0]
 
     def _load(self):
+        if self.tile is not None:
+            # already loaded
+            return
+
         self._load_paths(self.tile_svg)
         self._load_dimensions(self.tile_svg)
         self._load_parallelogram(self.tile_svg)
@@ -101,16 +114,6 @@ class Tile:
 
         return center, width, height
 
-    def _translate_tile(self, tile, shift):
-        translated_tile = []
-
-        for start, end in tile:
-            start += shift
-            end += shift
-            translated_tile.append((start.as_int().as_tuple(), end.as_int().as_tuple()))
-
-        return translated_tile
-
     def _scale_and_rotate(self, x_scale, y_scale, angle):
         transformed_shift0 = self.shift0.scale(x_scale, y_scale).rotate(angle)
         transformed_shift1 = self.shift1.scale(x_scale, y_scale).rotate(angle)
@@ -127,19 +130,35 @@ class Tile:
     def to_graph(self, shape, scale, angle):
         """Apply this tile to a shape, repeating as necessary.
 
+        Graphs are remembered for the last few shapes, scales and angles, so
+        that re-rendering the same meander (e.g. in the params dialog
+        preview) doesn't have to build the lattice again.  The caller gets
+        its own copy, so it's free to modify it.
+
         Return value:
             networkx.Graph with edges corresponding to lines in the pattern.
-              Each edge has an attribute 'line_string' with the LineString
-              representation of this edge.
         """
-        self._load()
         x_scale, y_scale = scale
-        shift0, shift1, tile = self._scale_and_rotate(x_scale, y_scale, angle)
+        key = (float(x_scale), float(y_scale), float(angle), hashlib.sha1(shape.wkb).digest())
+
+        # The graphs are stored pickled.  Unpickling is a quick way to make a
+        # copy that keeps the order of each node's neighbors, which the
+        # meander path depends on.  Graph.copy() doesn't.
+        pickled_graph = self._graphs.get(key)
+        if pickled_graph is not None:
+            self._graphs.move_to_end(key)
+            return pickle.loads(pickled_graph)
 
+        self._load()
+        shift0, shift1, tile = self._scale_and_rotate(x_scale, y_scale, angle)
         shape_center, shape_width, shape_height = self._get_center_and_dimensions(shape)
-        prepared_shape = prep(shape)
+        graph = self._generate_graph(shape, shape_center, shape_width, shape_height, shift0, shift1, tile)
 
-        return self._generate_graph(prepared_shape, shape_center, shape_width, shape_height, shift0, shift1, tile)
+        self._graphs[key] = pickle.dumps(graph, protocol=pickle.HIGHEST_PROTOCOL)
+        while len(self._graphs) > GRAPH_CACHE_SIZE:
+            self._graphs.popitem(last=False)
+
+        return graph
 
     @debug.time
     def _generate_graph(self, shape, shape_center, shape_width, shape_height, shift0, shift1, tile):
@@ -153,37 +172,80 @@ class Tile:
         x_cutoff = shape_width / 2 + tile_diagonal
         y_cutoff = shape_height / 2 + tile_diagonal
 
-        for repeat0 in range(-num_tiles, num_tiles):
-            for repeat1 in range(-num_tiles, num_tiles):
-                check_stop_flag()
+        # All of the tile offsets, in the same order as two nested loops over
+        # repeat0 and repeat1.
+        repeats = np.arange(-num_tiles, num_tiles)
+        repeat0, repeat1 = (repeat.ravel() for repeat in np.meshgrid(repeats, repeats, indexing='ij'))
+        offsets_x = repeat0 * shift0.x + repeat1 * shift1.x
+        offsets_y = repeat0 * shift0.y + repeat1 * shift1.y
+        in_range = (np.abs(offsets_x) <= x_cutoff) & (np.abs(offsets_y) <= y_cutoff)
+
+        # lines[i, j] is line j of the tile translated by offset i, with its
+        # end points rounded to whole pixels
+        shifts = np.column_stack((offsets_x[in_range] + shape_center.x, offsets_y[in_range] + shape_center.y))
+        tile_lines = np.array([(start.as_tuple(), end.as_tuple()) for start, end in tile]).reshape(-1, 2, 2)
+        lines = np.rint(tile_lines[np.newaxis] + shifts[:, np.newaxis, np.newaxis]).reshape(-1, 2, 2) + 0.0
+
+        check_stop_flag()
+        lines = self._lines_in_shape(shape, lines)
+        starts = zip(lines[:, 0, 0].tolist(), lines[:, 0, 1].tolist())
+        ends = zip(lines[:, 1, 0].tolist(), lines[:, 1, 1].tolist())
+        graph.add_edges_from(zip(starts, ends))
 
-                offset0 = repeat0 * shift0
-                offset1 = repeat1 * shift1
-                offset = offset0 + offset1
+        self._remove_dead_ends(graph)
 
-                if abs(offset.x) > x_cutoff or abs(offset.y) > y_cutoff:
-                    continue
+        return graph
 
-                this_tile = self._translate_tile(tile, offset + shape_center)
-                for line in this_tile:
-                    line_string = LineString(line)
-                    if shape.contains(line_string):
-                        graph.add_edge(line[0], line[1])
+    def _lines_in_shape(self, shape, lines):
+        """Return the lines (an (N, 2, 2) array) that the shape contains.
 
-        self._remove_dead_ends(graph)
+        Nearly all lines are decided by testing their end points all at once:
+        a line with an end point well outside the shape can't be inside it,
+        and a line far enough from the boundary can't cross it.  Only the
+        lines close to the boundary are tested individually.
+        """
 
-        return graph
+        if not len(lines):
+            return lines
+
+        xs = lines[:, :, 0].ravel()
+        ys = lines[:, :, 1].ravel()
+        outside = ~vectorized.contains(shape.buffer(1), xs, ys).reshape(-1, 2).all(axis=1)
+
+        # A line is inside if its midpoint is further from the boundary than
+        # half its length.  To keep the number of buffer() calls down, the
+        # lines are grouped by length, with the distances rounded up to powers
+        # of 2 ** (1 / 4).  A little extra distance makes up for buffer()
+        # only approximating the rounded corners.
+        midpoints = lines.mean(axis=1)
+        lengths = np.hypot(*(lines[:, 1] - lines[:, 0]).T)
+        exponents = np.ceil(4 * np.log2(np.maximum(lengths / 2, 1)))
+        inside = np.zeros(len(lines), dtype=bool)
+        for exponent in np.unique(exponents[~outside]):
+            group = np.flatnonzero((exponents == exponent) & ~outside & (lengths > 0))
+            inner_shape = shape.buffer(-(1.01 * 2 ** (exponent / 4) + 0.01))
+            if len(group) and not inner_shape.is_empty:
+                inside[group] = vectorized.contains(inner_shape, midpoints[group, 0], midpoints[group, 1])
+
+        prepared_shape = prep(shape)
+        for i in np.flatnonzero(~inside & ~outside):
+            inside[i] = prepared_shape.contains(LineString(lines[i]))
+
+        return lines[inside]
 
     @debug.time
     def _remove_dead_ends(self, graph):
-        graph.remove_edges_from(nx.selfloop_edges(graph))
-        while True:
-            dead_end_nodes = [node for node, degree in graph.degree() if degree <= 1]
-
-            if dead_end_nodes:
-                graph.remove_nodes_from(dead_end_nodes)
-            else:
-                return
+        graph.remove_edges_from(list(nx.selfloop_edges(graph)))
+
+        dead_ends = deque(node for node, degree in graph.degree() if degree <= 1)
+        while dead_ends:
+            node = dead_ends.popleft()
+            if node not in graph:
+                continue
+
+            neighbors = list(graph.neighbors(node))
+            graph.remove_node(node)
+            dead_ends.extend(neighbor for neighbor in neighbors if graph.degree(neighbor) <= 1)
 
 
 def all_tile_paths():
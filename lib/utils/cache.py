@@ -6,6 +6,9 @@ import os
 import atexit
 import hashlib
 import pickle
+import shutil
+import threading
+from collections import OrderedDict
 
 import appdirs
 import diskcache
@@ -30,15 +33,223 @@ def get_stitch_plan_cache():
     global __stitch_plan_cache
 
     if __stitch_plan_cache is None:
-        cache_dir = os.path.join(appdirs.user_config_dir('inkstitch'), 'cache', 'stitch_plan')
+        # Values are stored pickled by StitchPlanCache and the disk tier isn't
+        # culled automatically, which older versions of Ink/Stitch don't
+        # expect.  Keep them in a directory of their own.
+        cache_dir = os.path.join(appdirs.user_config_dir('inkstitch'), 'cache', 'stitch_plan_v2')
+
+        # Nothing reads the old directory anymore, and "Clear Stitch Plan
+        # Cache" wouldn't find it, so don't leave it taking up disk space.
+        shutil.rmtree(os.path.join(appdirs.user_config_dir('inkstitch'), 'cache', 'stitch_plan'), ignore_errors=True)
+
         size_limit = global_settings['cache_size'] * 1024 * 1024
-        __stitch_plan_cache = diskcache.Cache(cache_dir, size=size_limit)
-        __stitch_plan_cache.size_limit = size_limit
+        # StitchPlanCache culls the disk tier itself after each batch of writes
+        disk_cache = diskcache.Cache(cache_dir, size=size_limit, cull_limit=0)
+        disk_cache.size_limit = size_limit
+        memory_size_limit = global_settings['cache_memory_size'] * 1024 * 1024
+        __stitch_plan_cache = StitchPlanCache(disk_cache, memory_size_limit)
         atexit.register(__stitch_plan_cache.close)
 
     return __stitch_plan_cache
 
 
+__lettering_cache = None
+
+
+def get_lettering_cache():
+    """A disk cache for pre-processed lettering glyphs.
+
+    See lib/lettering/font_variant.py.
+    """
+
+    global __lettering_cache
+
+    if __lettering_cache is None:
+        cache_dir = os.path.join(appdirs.user_config_dir('inkstitch'), 'cache', 'lettering')
+        size_limit = global_settings['lettering_cache_size'] * 1024 * 1024
+        __lettering_cache = diskcache.Cache(cache_dir, size_limit=size_limit)
+        atexit.register(__lettering_cache.close)
+
+    return __lettering_cache
+
+
+__thread_palette_cache = None
+
+
+def get_thread_palette_cache():
+    """A disk cache for compiled thread palettes.
+
+    See lib/threads/catalog.py.
+    """
+
+    global __thread_palette_cache
+
+    if __thread_palette_cache is None:
+        cache_dir = os.path.join(appdirs.user_config_dir('inkstitch'), 'cache', 'thread_palettes')
+        __thread_palette_cache = diskcache.Cache(cache_dir)
+        atexit.register(__thread_palette_cache.close)
+
+    return __thread_palette_cache
+
+
+class StitchPlanCache(object):
+    """The stitch plan cache: an in-memory LRU cache in front of a diskcache.Cache.
+
+    Long-running processes (the params preview, the simulator, the lettering
+    preview...) look up the same elements over and over.  The memory tier
+    saves them the SQLite query for each of those lookups.
+
+    Values are kept pickled in both tiers, so everyone who gets a value gets
+    their own copy that they can safely modify, just like with diskcache.
+    This also tells us exactly how much memory the memory tier uses.
+
+    New values are written to the disk tier in batches (write-behind),
+    because each write is its own SQLite transaction otherwise.  Call flush()
+    to write them out right away.  This happens automatically at exit.
+
+    Previews render in background threads, so the memory tier and the
+    pending values are only touched while holding self._lock.
+    """
+
+    # write pending values to disk once there's this much of them
+    WRITE_BEHIND_LIMIT = 4 * 1024 * 1024
+
+    def __init__(self, disk_cache, memory_size_limit):
+        self.disk_cache = disk_cache
+        self.memory_size_limit = memory_size_limit
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._pending = {}
+        self._pending_size = 0
+
+        self.stats = {tier: dict(hits=0, misses=0, evictions=0) for tier in ('memory', 'disk')}
+
+        # flush() and cull() call each other, so this has to be reentrant
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory or key in self._pending:
+                return True
+
+        return key in self.disk_cache
+
+    def __getitem__(self, key):
+        value = self._get_pickled(key)
+        if value is None:
+            raise KeyError(key)
+
+        return pickle.loads(value)
+
+    def __setitem__(self, key, value):
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self._remember(key, value)
+
+            self._pending_size += len(value) - len(self._pending.get(key, b''))
+            self._pending[key] = value
+            if self._pending_size >= self.WRITE_BEHIND_LIMIT:
+                self.flush()
+
+    def get(self, key, default=None):
+        value = self._get_pickled(key)
+        if value is None:
+            return default
+
+        return pickle.loads(value)
+
+    def flush(self):
+        """Write pending values to the disk tier."""
+
+        with self._lock:
+            if not self._pending:
+                return
+
+            # Hold the lock until the values are on disk, so that nobody
+            # misses them in between.
+            with self.disk_cache.transact(retry=True):
+                for key, value in self._pending.items():
+                    self.disk_cache.set(key, value, retry=True)
+
+            self._pending.clear()
+            self._pending_size = 0
+
+            self.cull(retry=True)
+
+    def clear(self, retry=False):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._pending.clear()
+            self._pending_size = 0
+
+            return self.disk_cache.clear(retry=retry)
+
+    def cull(self, retry=False):
+        with self._lock:
+            self.flush()
+
+            evictions = self.disk_cache.cull(retry=retry)
+            self.stats['disk']['evictions'] += evictions
+            return evictions
+
+    @property
+    def size_limit(self):
+        return self.disk_cache.size_limit
+
+    @size_limit.setter
+    def size_limit(self, size_limit):
+        self.disk_cache.size_limit = size_limit
+
+    def close(self):
+        from ..debug import debug
+
+        self.flush()
+        debug.log(f"stitch plan cache stats: {self.stats}")
+        self.disk_cache.close()
+
+    def _get_pickled(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory']['hits'] += 1
+                return value
+
+            self.stats['memory']['misses'] += 1
+
+            value = self._pending.get(key)
+            if value is None:
+                value = self.disk_cache.get(key)
+                if value is None:
+                    self.stats['disk']['misses'] += 1
+                    return None
+
+                self.stats['disk']['hits'] += 1
+
+            self._remember(key, value)
+            return value
+
+    def _remember(self, key, value):
+        # the caller must hold self._lock
+        if len(value) > self.memory_size_limit:
+            return
+
+        old_value = self._memory.pop(key, None)
+        if old_value is not None:
+            self._memory_size -= len(old_value)
+
+        self._memory[key] = value
+        self._memory_size += len(value)
+
+        while self._memory_size > self.memory_size_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats['memory']['evictions'] += 1
+
+
 class CacheKeyGenerator(object):
     """Generate cache keys given arbitrary data.
 
@@ -3,6 +3,7 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
+import bisect
 import math
 import typing
 
@@ -150,10 +151,23 @@ def cut_path(points, length):
 
 
 class Point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x: typing.Union[float, numpy.float64], y: typing.Union[float, numpy.float64]):
         self.x = float(x)
         self.y = float(y)
 
+    def __getstate__(self):
+        return (self.x, self.y)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # a Point pickled before we used __slots__
+            self.x = state['x']
+            self.y = state['y']
+        else:
+            self.x, self.y = state
+
     @classmethod
     def from_shapely_point(cls, point):
         return cls(point.x, point.y)
@@ -163,7 +177,7 @@ class Point:
         return cls(point[0], point[1])
 
     def __json__(self):
-        return vars(self)
+        return dict(x=self.x, y=self.y)
 
     def __add__(self, other):
         return self.__class__(self.x + other.x, self.y + other.y)
@@ -242,6 +256,49 @@ class Point:
         return "({0:.3f}, {1:.3f})".format(self.x, self.y)
 
 
+class ArcLengthIndex:
+    """Find points along a polyline by how far along it they are.
+
+    This does the same thing as LineString.interpolate(), but the cumulative
+    length of the polyline is only computed once, so each lookup is just a
+    binary search.  The arithmetic is the same as GEOS uses, so the points
+    are exactly the same as the ones interpolate() would give us.
+    """
+
+    def __init__(self, points):
+        coords = numpy.array([(point[0], point[1]) for point in points], dtype=numpy.float64).reshape(-1, 2)
+        deltas = numpy.diff(coords, axis=0)
+        segment_lengths = numpy.sqrt(deltas[:, 0] * deltas[:, 0] + deltas[:, 1] * deltas[:, 1])
+
+        # plain lists are faster than arrays for one lookup at a time
+        self.xs, self.ys = coords.T.tolist()
+        self.segment_lengths = segment_lengths.tolist()
+        self.cumulative_lengths = [0.0] + numpy.cumsum(segment_lengths).tolist()
+        self.length = self.cumulative_lengths[-1]
+
+    def interpolate(self, distance, normalized=False):
+        """Return the Point that is distance along the polyline."""
+
+        if normalized:
+            distance *= self.length
+
+        if distance <= 0.0:
+            return Point(self.xs[0], self.ys[0])
+
+        # the first vertex that is strictly further along than distance
+        i = bisect.bisect_right(self.cumulative_lengths, distance)
+        if i >= len(self.cumulative_lengths):
+            return Point(self.xs[-1], self.ys[-1])
+
+        fraction = (distance - self.cumulative_lengths[i - 1]) / self.segment_lengths[i - 1]
+        if fraction >= 1.0:
+            return Point(self.xs[i], self.ys[i])
+
+        x0 = self.xs[i - 1]
+        y0 = self.ys[i - 1]
+        return Point((self.xs[i] - x0) * fraction + x0, (self.ys[i] - y0) * fraction + y0)
+
+
 def line_string_to_point_list(line_string):
     return [Point(*point) for point in line_string.coords]
 
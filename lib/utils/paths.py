@@ -3,6 +3,7 @@
 # Copyright (c) 2010 Authors
 # Licensed under the GNU GPL version 3.0 or later.  See the file LICENSE for details.
 
+import json
 import sys
 import os
 from os.path import dirname, realpath
@@ -37,3 +38,17 @@ def get_user_dir(name=None):
         path = os.path.join(path, name)
 
     return path
+
+
+def get_custom_font_dir():
+    custom_font_dir_path = get_user_dir('custom_dirs.json')
+    try:
+        with open(custom_font_dir_path, 'r') as custom_dirs:
+            custom_dir = json.load(custom_dirs)
+    except (IOError, ValueError):
+        return ""
+    try:
+        return custom_dir['custom_font_dir']
+    except KeyError:
+        pass
+    return ""
@@ -1,6 +1,6 @@
 from hashlib import blake2s
 from math import ceil
-from itertools import count, chain
+from itertools import count
 import numpy as np
 
 # Framework for reproducible pseudo-random number generation.
@@ -20,6 +20,7 @@ def join_args(*args):
 
 
 MAX_UNIFORM_INT = 2 ** 32 - 1
+_DIGEST_DTYPE = np.dtype('>u4')
 
 
 def uniform_ints(*args):
@@ -29,11 +30,8 @@ def uniform_ints(*args):
 
     s = join_args(*args)
     # blake2s is python's fastest hash algorithm for small inputs and is designed to be usable as a PRNG.
-    h = blake2s(s.encode()).hexdigest()
-    nums = []
-    for i in range(0, 64, 8):
-        nums.append(int(h[i:i + 8], 16))
-    return np.array(nums)
+    # The 32 byte digest is read as 8 big-endian uint32, which is what slicing the hex digest used to give us.
+    return np.frombuffer(blake2s(s.encode()).digest(), dtype=_DIGEST_DTYPE).astype(np.int64)
 
 
 def uniform_floats(*args):
@@ -43,16 +41,29 @@ def uniform_floats(*args):
     return uniform_ints(*args) / MAX_UNIFORM_INT
 
 
+def uniform_float_blocks(start: int, stop: int, *args):
+    # Bulk version of uniform_floats(*args, counter) for every counter in range(start, stop).
+    # Returns a (stop - start, 8) array: row i is exactly uniform_floats(*args, start + i).
+    prefix = (join_args(*args, "") if args else "").encode()
+    digests = b"".join(blake2s(prefix + str(counter).encode()).digest() for counter in range(start, stop))
+    return np.frombuffer(digests, dtype=_DIGEST_DTYPE).reshape(-1, 8) / MAX_UNIFORM_INT
+
+
+def iter_uniform_float_blocks(*args, chunk_size=64):
+    # returns an infinite sequence of the blocks uniform_floats(*args, 0), uniform_floats(*args, 1), ...
+    # The blocks are generated chunk_size at a time.
+    for start in count(0, chunk_size):
+        yield from uniform_float_blocks(start, start + chunk_size, *args)
+
+
 def n_uniform_floats(n: int, *args):
     # returns a fixed number (which may exceed 8) of floats in the range [0,1]
-    seed = join_args(*args)
-    nBlocks = ceil(n / 8)
-    blocks = [uniform_floats(seed, x) for x in range(nBlocks)]
-    return np.concatenate(blocks)[0:n]
+    return uniform_float_blocks(0, ceil(n / 8), join_args(*args)).ravel()[0:n]
 
 
-def iter_uniform_floats(*args):
+def iter_uniform_floats(*args, chunk_size=8):
     # returns an infinite sequence of floats in the range [0,1]
+    # chunk_size is the number of blocks of 8 floats that are generated at a time.
     seed = join_args(*args)
-    blocks = map(lambda x: list(uniform_floats(seed, x)), count(0))
-    return chain.from_iterable(blocks)
+    for start in count(0, chunk_size):
+        yield from uniform_float_blocks(start, start + chunk_size, seed).ravel().tolist()
@@ -12,7 +12,13 @@ DEFAULT_METADATA = {
 }
 
 DEFAULT_SETTINGS = {
-    "cache_size": 100
+    "cache_size": 100,
+    # size of the in-memory tier of the stitch plan cache in MB
+    "cache_memory_size": 50,
+    # size of the cache for pre-processed lettering glyphs in MB
+    "lettering_cache_size": 50,
+    # 1: generate the stitch plan (and write zip exports) in a single process, 0: use all CPU cores
+    "stitch_plan_processes": 1
 }
 
 